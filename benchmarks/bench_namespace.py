@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Measures the time and memory needed to register callbacks for large
+namespaces, and the time to resolve an address once registered.
+
+Each size is measured in a child process, so that the memory of one
+run does not hide the memory of the next.
+
+Usage: python benchmarks/bench_namespace.py [size ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def addresses(size):
+    """
+    Yields addresses of parameters of channels of fixtures, 20 channels
+    of 10 parameters each per fixture.
+    """
+    for i in xrange(size):
+        yield "/fixture/%d/channel/%d/param%d" % (i // 200, i // 10 % 20, i % 10)
+
+
+def measure(size):
+    from txosc import dispatch
+    from txosc import osc
+    osc.setAddressCacheSize(0)
+    callback = lambda message, client: None
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    receiver = dispatch.Receiver()
+    for address in addresses(size):
+        receiver.addCallback(address, callback)
+    elapsed = time.time() - start
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024.0
+    address = "/fixture/%d/channel/3/param7" % (size // 400)
+    number = 10000
+    start = time.time()
+    for i in xrange(number):
+        receiver._matchCallbacks(address)
+    walk = (time.time() - start) / number * 1e6
+    print "%10d %12.2f %12.1f %10.2f" % (size, elapsed, memory, walk)
+
+
+def main(sizes):
+    print "%10s %12s %12s %10s" % ("addresses", "register (s)", "memory (MB)", "walk (us)")
+    sys.stdout.flush()
+    for size in sizes:
+        subprocess.check_call([sys.executable, __file__, "--measure", str(size)],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(int(sys.argv[2]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
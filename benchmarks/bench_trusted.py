@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Compares creating and encoding arguments with and without the checks
+of their values.
+
+Usage: python benchmarks/bench_trusted.py [repeat]
+"""
+import sys
+import timeit
+
+setup = """
+from txosc import osc
+color = (255, 128, 0, 255)
+ints = range(16)
+codec = osc.getTypeTagCodec("i" * 16)
+message = osc.Message("/ints", *ints)
+osc.setTrustedMode(False)
+"""
+
+# name, checked statement, trusted statement, and optionally extra
+# setup for the trusted statement, which is not timed
+benchmarks = [
+    ("ColorArgument(value)",
+        "osc.ColorArgument(color)",
+        "osc.ColorArgument.fromTrustedValue(color)"),
+    ("createArguments, 16 ints",
+        "codec.createArguments(ints)",
+        "codec.createArguments(ints, True)"),
+    ("Message.toBinary, 16 ints",
+        "message.toBinary()",
+        "message.toBinary()",
+        "osc.setTrustedMode(True)"),
+    ]
+
+
+def main(repeat=3, number=20000):
+    print "%-28s %12s %12s %8s" % ("", "checked (us)", "trusted (us)", "speedup")
+    for entry in benchmarks:
+        name, checked, trusted = entry[:3]
+        trustedSetup = setup + "\n".join(entry[3:])
+        results = []
+        for stmt, stmtSetup in (checked, setup), (trusted, trustedSetup):
+            best = min(timeit.repeat(stmt, stmtSetup, repeat=repeat, number=number))
+            results.append(best / number * 1e6)
+        print "%-28s %12.2f %12.2f %7.2fx" % (name, results[0], results[1], results[0] / results[1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
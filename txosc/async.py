@@ -12,7 +12,6 @@ import socket
 from twisted.internet import defer, protocol
 from twisted.application.internet import MulticastServer
 from txosc.osc import *
-from txosc.osc import _elementFromBinary
 
 #
 # Stream based client/server protocols
@@ -40,6 +39,10 @@ class StreamBasedProtocol(protocol.Protocol):
         followed by the contents of the first packet, followed by the
         size of the second packet, etc.
 
+        The connection is closed if a size is negative, or larger than
+        allowed by the limits of the factory, before the packet is
+        buffered.
+
         @type data: L{str}
         """
         self._buffer += data
@@ -47,6 +50,15 @@ class StreamBasedProtocol(protocol.Protocol):
             return
         if self._pkgLen is None:
             self._pkgLen = struct.unpack(">i", self._buffer[:4])[0]
+            try:
+                if self._pkgLen < 0:
+                    raise OscError("Invalid packet size: %d" % (self._pkgLen))
+                if self.factory.limits is not None:
+                    self.factory.limits.checkPacketSize(self._pkgLen)
+            except OscError:
+                self._buffer = ""
+                self.transport.loseConnection()
+                return
         if len(self._buffer) < self._pkgLen + 4:
             print "waiting for %d more bytes" % (self._pkgLen + 4 - len(self._buffer))
             return
@@ -55,8 +67,7 @@ class StreamBasedProtocol(protocol.Protocol):
         self._pkgLen = None
 
         if payload:
-            element = _elementFromBinary(payload)
-            self.factory.gotElement(element)
+            self.factory.gotBinary(payload)
 
         if len(self._buffer):
             self.dataReceived("")
@@ -65,13 +76,58 @@ class StreamBasedProtocol(protocol.Protocol):
     def send(self, element):
         """
         Send an OSC element over the TCP wire.
-        @param element: L{txosc.osc.Message} or L{txosc.osc.Bundle}
+        @param element: See L{txosc.osc.elementToBinary}.
         """
-        binary = element.toBinary()
-        self.transport.write(struct.pack(">i", len(binary)) + binary)
+        self._writePacket(elementToBinary(element))
         #TODO: return a Deferred
 
 
+    def _writePacket(self, binary):
+        """
+        Writes an encoded packet, prefixed with its size.
+        """
+        self.transport.write(struct.pack(">i", len(binary)) + binary)
+
+
+
+class SlipProtocol(StreamBasedProtocol):
+    """
+    OSC 1.1 over a stream, such as TCP or a serial line, with SLIP
+    framing instead of a size prefix.
+
+    A packet which cannot be decoded is dropped, and the following
+    ones are decoded from the next frame boundary.
+
+    @ivar decodeErrors: The number of frames dropped because their
+        packet could not be decoded.
+    """
+    decodeErrors = 0
+
+    def connectionMade(self):
+        StreamBasedProtocol.connectionMade(self)
+        self._decoder = SlipDecoder(self.factory.limits)
+
+
+    def dataReceived(self, data):
+        """
+        Called whenever data is received.
+
+        @type data: L{str}
+        """
+        for packet in self._decoder.feed(data):
+            try:
+                self.factory.gotBinary(packet)
+            except OscError:
+                self.decodeErrors += 1
+
+
+    def _writePacket(self, binary):
+        """
+        Writes an encoded packet in a SLIP frame.
+        """
+        self.transport.write(slipEncode(binary))
+
+
 
 class StreamBasedFactory(object):
     """
@@ -82,13 +138,25 @@ class StreamBasedFactory(object):
         incoming messages to.
     @ivar connectedProtocol: An instance of L{StreamBasedProtocol}
         representing the current connection.
+    @ivar lazy: Whether to decode incoming messages as
+        L{txosc.osc.LazyMessage} instances.
+    @ivar arrays: Whether to decode runs of float or integer arguments as
+        L{txosc.osc.TypedArrayArgument} instances.
+    @ivar limits: The L{txosc.osc.DecodeLimits} of the received packets,
+        or C{None}. Packets which exceed them are dropped.
     """
     receiver = None
     connectedProtocol = None
+    lazy = False
+    arrays = False
+    limits = None
 
-    def __init__(self, receiver=None):
+    def __init__(self, receiver=None, limits=None):
         if receiver:
             self.receiver = receiver
+        if limits is None:
+            limits = DecodeLimits()
+        self.limits = limits
 
 
     def send(self, element):
@@ -101,6 +169,19 @@ class StreamBasedFactory(object):
         else:
             raise OscError("Element received, but no Receiver in place: " + str(element))
 
+
+    def gotBinary(self, data):
+        """
+        Dispatches the messages of a binary element as they are decoded.
+        """
+        if self.receiver:
+            try:
+                self.receiver.dispatchBinary(data, self, self.lazy, self.arrays, self.limits)
+            except DecodeLimitError:
+                pass
+        else:
+            raise OscError("Element received, but no Receiver in place: " + repr(data))
+
     def __str__(self):
         return str(self.connectedProtocol.transport.client)
 
@@ -111,8 +192,8 @@ class ClientFactory(protocol.ClientFactory, StreamBasedFactory):
     """
     protocol = StreamBasedProtocol
 
-    def __init__(self, receiver=None):
-        StreamBasedFactory.__init__(self, receiver)
+    def __init__(self, receiver=None, limits=None):
+        StreamBasedFactory.__init__(self, receiver, limits)
         self.deferred = defer.Deferred()
 
 
@@ -123,6 +204,20 @@ class ServerFactory(protocol.ServerFactory, StreamBasedFactory):
     protocol = StreamBasedProtocol
 
 
+class SlipClientFactory(ClientFactory):
+    """
+    TCP client factory, using SLIP framing.
+    """
+    protocol = SlipProtocol
+
+
+class SlipServerFactory(ServerFactory):
+    """
+    TCP server factory, using SLIP framing.
+    """
+    protocol = SlipProtocol
+
+
 #
 # Datagram client/server protocols
 #
@@ -133,17 +228,33 @@ class DatagramServerProtocol(protocol.DatagramProtocol):
 
     @ivar receiver: The L{Receiver} instance to dispatch received
         elements to.
+    @ivar lazy: Whether to decode incoming messages as
+        L{txosc.osc.LazyMessage} instances, whose arguments are only
+        decoded when a callback reads them.
+    @ivar arrays: Whether to decode runs of float or integer arguments as
+        L{txosc.osc.TypedArrayArgument} instances.
+    @ivar limits: The L{txosc.osc.DecodeLimits} of the received
+        datagrams, or C{None}. Datagrams which exceed them are dropped.
     """
+    lazy = False
+    arrays = False
 
-    def __init__(self, receiver):
+    def __init__(self, receiver, limits=None):
         """
         @param receiver: L{Receiver} instance.
+        @param limits: L{txosc.osc.DecodeLimits} instance. Default
+            limits are created if not given.
         """
         self.receiver = receiver
+        if limits is None:
+            limits = DecodeLimits()
+        self.limits = limits
 
     def datagramReceived(self, data, (host, port)):
-        element = _elementFromBinary(data)
-        self.receiver.dispatch(element, (host, port))
+        try:
+            self.receiver.dispatchBinary(data, (host, port), self.lazy, self.arrays, self.limits)
+        except DecodeLimitError:
+            pass
 
 class MulticastDatagramServerProtocol(DatagramServerProtocol):
     """
@@ -155,7 +266,7 @@ class MulticastDatagramServerProtocol(DatagramServerProtocol):
     
     This way, many listeners can listen on the same port, same host, to the same multicast group. (in this case, the 224.0.0.1 multicast group)
     """
-    def __init__(self, receiver, multicast_addr="224.0.0.1"):
+    def __init__(self, receiver, multicast_addr="224.0.0.1", limits=None):
         """
         @param multicast_addr: IP address of the multicast group.
         @param receiver: L{txosc.dispatch.Receiver} instance.
@@ -163,7 +274,7 @@ class MulticastDatagramServerProtocol(DatagramServerProtocol):
         @type receiver: L{txosc.dispatch.Receiver}
         """
         self.multicast_addr = multicast_addr
-        DatagramServerProtocol.__init__(self, receiver)
+        DatagramServerProtocol.__init__(self, receiver, limits)
         
     def startProtocol(self):
         """
@@ -179,9 +290,8 @@ class DatagramClientProtocol(protocol.DatagramProtocol):
     def send(self, element, (host, port)):
         """
         Send a L{txosc.osc.Message} or L{txosc.osc.Bundle} to the address specified.
-        @type element: L{txosc.osc.Message}
+        @param element: See L{txosc.osc.elementToBinary}.
         """
-        data = element.toBinary()
-        self.transport.write(data, (socket.gethostbyname(host), port))
+        self.transport.write(elementToBinary(element), (socket.gethostbyname(host), port))
 
 
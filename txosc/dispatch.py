@@ -6,12 +6,359 @@
 """
 OSC message address dispatching to callbacks
 """
+import bisect
+import heapq
+import itertools
 import string
 import math
 import struct
 import re
 from txosc.osc import *
 
+# characters which have a special meaning in a wildcard, or in the
+# regular expression it is translated to
+_wildcardChars = re.compile(r"[*?\[\]{}]")
+_specialChars = re.compile(r"[*?\[\]{}().|,^$+\\]")
+_invalidChars = re.compile(r"[ #,/]")
+_literalSuffix = re.compile(r"[^*?\[\]{}]*$")
+
+wildcardCache = LRUCache(maxSize=1024)
+
+# callbacks are ordered by decreasing priority, then by registration
+_registrationCounter = itertools.count()
+_PRIORITY_STEP = 1 << 48
+
+
+def _compileWildcard(wildcard):
+    """
+    Compiles a wildcard into a matcher, see L{AddressNode.compileWildcard}.
+    """
+    if wildcard == "*":
+        return lambda value: True
+    if not _specialChars.search(wildcard.replace("*", "").replace("?", "", 1)):
+        if "?" in wildcard:
+            if "*" not in wildcard:
+                # a single "?" matches zero or one character
+                prefix, suffix = wildcard.split("?")
+                size = len(wildcard)
+                return lambda value: (len(value) == size or len(value) == size - 1) and value.startswith(prefix) and value.endswith(suffix)
+        elif "*" not in wildcard:
+            return wildcard.__eq__
+        else:
+            return _compileStars(wildcard.split("*"))
+
+    regex = wildcard.replace("*", ".*")
+    regex = regex.replace("?", ".?")
+    regex = regex.replace("[!", "[^")
+    regex = regex.replace("(", "\(")
+    regex = regex.replace(")", "\)")
+    regex = regex.replace("|", "\|")
+    regex = regex.replace("{", "(")
+    regex = regex.replace("}", ")")
+    regex = regex.replace(",", "|")
+    try:
+        match = re.compile("^" + regex + "$").match
+    except re.error:
+        raise OscError("Invalid character in wildcard.")
+    if _wildcardChars.search(wildcard):
+        return match
+    return lambda value: value == wildcard or match(value) is not None
+
+
+def _compileStars(parts):
+    """
+    Compiles a wildcard whose only special characters are C{*}, split
+    on them, into a matcher using string methods.
+    """
+    prefix = parts[0]
+    suffix = parts[-1]
+    middle = [part for part in parts[1:-1] if part]
+    minimum = len(prefix) + len(suffix)
+    if not middle:
+        if not suffix:
+            return lambda value: value.startswith(prefix)
+        if not prefix:
+            return lambda value: value.endswith(suffix)
+        return lambda value: len(value) >= minimum and value.startswith(prefix) and value.endswith(suffix)
+
+    def matchStars(value):
+        if len(value) < minimum or not value.startswith(prefix) or not value.endswith(suffix):
+            return False
+        position = len(prefix)
+        stop = len(value) - len(suffix)
+        for part in middle:
+            position = value.find(part, position, stop)
+            if position < 0:
+                return False
+            position += len(part)
+        return True
+    return matchStars
+
+
+_ANY = (frozenset(), True)
+
+
+class _WildcardAutomaton(object):
+    """
+    A nondeterministic automaton recognizing the values a wildcard
+    matches, used to find out whether two wildcards overlap.
+
+    Each state has a list of empty moves, and a list of moves which
+    consume one character, as two-item tuples of a character token and
+    a state. A character token is a two-item tuple with a C{frozenset}
+    of characters and whether the set is negated. Alternatives such as
+    C{{foo,bar}} are branches of the automaton, so its size grows with
+    the length of the wildcard only.
+    """
+
+    def __init__(self, wildcard):
+        """
+        @raise OscError: If the wildcard is invalid.
+        """
+        self.empty = []
+        self.moves = []
+        self.start = self._newState()
+        self.end, position = self._parse(wildcard, 0, self.start, False)
+        if position != len(wildcard):
+            raise OscError("Invalid character in wildcard.")
+
+
+    def _newState(self):
+        self.empty.append([])
+        self.moves.append([])
+        return len(self.empty) - 1
+
+
+    def _parse(self, wildcard, i, state, inGroup):
+        """
+        Adds the states for the wildcard from position C{i}, until its
+        end, or the end of the alternative of a group.
+
+        @return: The last state, and the position where parsing stopped.
+        """
+        while i < len(wildcard):
+            char = wildcard[i]
+            if inGroup and char in ",}":
+                return state, i
+            if char == "*":
+                loop = self._newState()
+                self.empty[state].append(loop)
+                self.moves[loop].append((_ANY, loop))
+                state = loop
+            elif char == "?":
+                # "?" matches zero or one character
+                following = self._newState()
+                self.empty[state].append(following)
+                self.moves[state].append((_ANY, following))
+                state = following
+            elif char == "[":
+                end = wildcard.find("]", i + 1)
+                if end < 0:
+                    raise OscError("Invalid character in wildcard.")
+                following = self._newState()
+                self.moves[state].append((_characterClass(wildcard[i + 1:end]), following))
+                state = following
+                i = end
+            elif char == "{":
+                joined = self._newState()
+                while True:
+                    last, i = self._parse(wildcard, i + 1, state, True)
+                    if i >= len(wildcard):
+                        raise OscError("Invalid character in wildcard.")
+                    self.empty[last].append(joined)
+                    if wildcard[i] == "}":
+                        break
+                state = joined
+            elif char == "}":
+                raise OscError("Invalid character in wildcard.")
+            else:
+                following = self._newState()
+                self.moves[state].append(((frozenset(char), False), following))
+                state = following
+            i += 1
+        return state, i
+
+
+def _characterClass(body):
+    """
+    Returns the character token of the inside of a C{[...]} wildcard.
+    """
+    negated = body.startswith("!")
+    if negated:
+        body = body[1:]
+    chars = set()
+    j = 0
+    while j < len(body):
+        if j + 2 < len(body) and body[j + 1] == "-":
+            chars.update([chr(c) for c in range(ord(body[j]), ord(body[j + 2]) + 1)])
+            j += 3
+        else:
+            chars.add(body[j])
+            j += 1
+    return frozenset(chars), negated
+
+
+def _charsOverlap(first, second):
+    """
+    Returns whether two character tokens can match the same character.
+    """
+    (firstChars, firstNegated), (secondChars, secondNegated) = first, second
+    if firstNegated and secondNegated:
+        return True
+    if firstNegated:
+        return bool(secondChars - firstChars)
+    if secondNegated:
+        return bool(firstChars - secondChars)
+    return not firstChars.isdisjoint(secondChars)
+
+
+def _automataOverlap(first, second):
+    """
+    Returns whether two L{_WildcardAutomaton} accept a value in common,
+    by searching the pairs of their states reachable together. This
+    takes a time proportional to the product of their sizes.
+    """
+    accept = (first.end, second.end)
+    pending = [(first.start, second.start)]
+    visited = set(pending)
+    while pending:
+        pair = pending.pop()
+        if pair == accept:
+            return True
+        a, b = pair
+        following = [(c, b) for c in first.empty[a]]
+        following.extend([(a, c) for c in second.empty[b]])
+        for tokenA, c in first.moves[a]:
+            for tokenB, d in second.moves[b]:
+                if _charsOverlap(tokenA, tokenB):
+                    following.append((c, d))
+        for pair in following:
+            if pair not in visited:
+                visited.add(pair)
+                pending.append(pair)
+    return False
+
+
+class _WildcardIndex(object):
+    """
+    A set of names, some of which are wildcards, which finds those
+    matching a given value.
+
+    Wildcards are indexed by the literal text they start with or, if
+    they start with a special character, end with. Only the wildcards
+    whose prefix or suffix is found in the value are tried.
+    """
+
+    def __init__(self):
+        self._literals = set()
+        self._matchers = {}
+        self._prefixes = {}
+        self._prefixLengths = {}
+        self._suffixes = {}
+        self._suffixLengths = {}
+        self._others = {}
+
+
+    def _locate(self, wildcard):
+        """
+        Returns the buckets, the counts of key lengths and the key under
+        which a wildcard is indexed.
+        """
+        prefix = wildcard[:_wildcardChars.search(wildcard).start()]
+        if prefix:
+            return self._prefixes, self._prefixLengths, prefix
+        suffix = wildcard[_literalSuffix.search(wildcard).start():]
+        if suffix:
+            return self._suffixes, self._suffixLengths, suffix
+        return None, None, None
+
+
+    def add(self, name, matcher=None):
+        """
+        Adds a name, or a wildcard with its matcher.
+        """
+        if not AddressNode.isWildcard(name):
+            self._literals.add(name)
+            return
+        if matcher is None:
+            matcher = AddressNode.compileWildcard(name)
+        if name in self._matchers:
+            self.remove(name)
+        self._matchers[name] = matcher
+        buckets, lengths, key = self._locate(name)
+        if buckets is None:
+            self._others[name] = matcher
+        else:
+            buckets.setdefault(key, {})[name] = matcher
+            lengths[len(key)] = lengths.get(len(key), 0) + 1
+
+
+    def remove(self, name):
+        """
+        Removes a name or a wildcard.
+
+        @raise KeyError: If it is not in this index.
+        """
+        if name in self._literals:
+            self._literals.remove(name)
+            return
+        del self._matchers[name]
+        buckets, lengths, key = self._locate(name)
+        if buckets is None:
+            del self._others[name]
+            return
+        bucket = buckets[key]
+        del bucket[name]
+        if not bucket:
+            del buckets[key]
+        lengths[len(key)] -= 1
+        if not lengths[len(key)]:
+            del lengths[len(key)]
+
+
+    def matches(self, value):
+        """
+        Returns the names which are equal to the value, and the
+        wildcards which match it.
+
+        @type value: C{str}
+        @rtype: C{list}
+        """
+        found = []
+        if value in self._literals:
+            found.append(value)
+        size = len(value)
+        for length in self._prefixLengths:
+            if length <= size:
+                bucket = self._prefixes.get(value[:length])
+                if bucket:
+                    found.extend([name for name, matcher in bucket.iteritems() if matcher(value)])
+        for length in self._suffixLengths:
+            if length <= size:
+                bucket = self._suffixes.get(value[-length:])
+                if bucket:
+                    found.extend([name for name, matcher in bucket.iteritems() if matcher(value)])
+        if self._others:
+            found.extend([name for name, matcher in self._others.iteritems() if matcher(value)])
+        return found
+
+
+    def __contains__(self, name):
+        return name in self._literals or name in self._matchers
+
+
+    def __len__(self):
+        return len(self._literals) + len(self._matchers)
+
+
+    def __iter__(self):
+        for name in self._literals:
+            yield name
+        for name in self._matchers:
+            yield name
+
+
+
 class AddressNode(object):
     """
     A node in the tree of OSC addresses.
@@ -20,9 +367,30 @@ class AddressNode(object):
 
     This class is provided so that the programmer can separate the handling of an address sub-tree in the OSC addresses. For example, an AddressNode can be added to a receiver in order to handle all the messages starting with "/egg/spam/". AddressNode classes can be nested.
 
+    The callbacks resolved for an address are cached by the node which
+    is asked for them, usually the L{Receiver}. Every change to the
+    tree increments the generation counter of the changed node and of
+    its ancestors, which discards their cached callbacks.
+
+    Nodes have no instance dictionary, their callbacks are stored in a
+    C{tuple}, in the order they are called, and the dictionaries of
+    their children are only created when needed, so that large
+    namespaces stay compact.
+
     @ivar _name: the name of this node. 
     @ivar _parent: the parent node.
+    @ivar _childNodes: C{dict} of child nodes by name, or C{None}.
+    @ivar _wildcardNodes: C{_WildcardIndex} of the names of the child
+        nodes which are wildcards, or C{None}.
+    @ivar _callbacks: C{tuple} of callbacks, in the order they are called.
+    @ivar _order: C{tuple} of the sort keys of the callbacks, which
+        combine their priority and registration order.
+    @cvar callbackCacheSize: The maximum number of addresses whose
+        callbacks are cached.
     """
+    __slots__ = ("_name", "_parent", "_childNodes", "_wildcardNodes", "_callbacks",
+        "_order", "_generation", "_callbackCache", "_cacheGeneration", "__weakref__")
+    callbackCacheSize = 1024
 
     def __init__(self, name=None, parent=None):
         """
@@ -30,31 +398,75 @@ class AddressNode(object):
         @param parent: L{Receiver} or L{AddressNode}
         """
         self._name = name
-        self._parent = parent
-        self._childNodes = {}
-        self._callbacks = set()
         self._parent = None
-        self._wildcardNodes = set()
+        self._childNodes = None
+        self._wildcardNodes = None
+        self._callbacks = ()
+        self._order = ()
+        self._generation = 0
+        self._callbackCache = None
+        self._cacheGeneration = 0
 
 
     def removeCallbacks(self):
         """
         Remove all callbacks from this node.
         """
-        self._callbacks = set()
+        self._callbacks = ()
+        self._order = ()
+        self._changed()
         self._checkRemove()
 
 
+    def _changed(self):
+        """
+        Marks this node and its ancestors as modified, so that their
+        cached callbacks are discarded.
+        """
+        node = self
+        while node is not None:
+            node._generation += 1
+            node = node._parent
+
+
+    def _addChild(self, name, node):
+        """
+        Stores a child node, and the matcher of its name if it is a wildcard.
+        """
+        if AddressNode.isWildcard(name):
+            matcher = AddressNode.compileWildcard(name)
+            if self._wildcardNodes is None:
+                self._wildcardNodes = _WildcardIndex()
+            self._wildcardNodes.add(name, matcher)
+        if self._childNodes is None:
+            self._childNodes = {}
+        self._childNodes[name] = node
+
+
+    def _removeChild(self, name):
+        """
+        Forgets a child node.
+        """
+        del self._childNodes[name]
+        if not self._childNodes:
+            self._childNodes = None
+        if self._wildcardNodes and name in self._wildcardNodes:
+            self._wildcardNodes.remove(name)
+            if not self._wildcardNodes:
+                self._wildcardNodes = None
+
+
     def setName(self, newname):
         """
         Give this node a new name.
         @type newname: C{str}
         """
-        if self._parent:
-            del self._parent._childNodes[self._name]
+        if self._parent is not None:
+            self._parent._removeChild(self._name)
         self._name = newname
-        if self._parent:
-            self._parent._childNodes[self._name] = self
+        if self._parent is not None:
+            self._parent._addChild(self._name, self)
+        self._changed()
 
 
     def setParent(self, newparent):
@@ -62,11 +474,13 @@ class AddressNode(object):
         Reparent this node to another parent.
         @param newparent: L{Receiver} or L{AddressNode}
         """
-        if self._parent:
-            del self._parent._childNodes[self._name]
+        if self._parent is not None:
+            self._parent._removeChild(self._name)
+            self._parent._changed()
             self._parent._checkRemove()
         self._parent = newparent
-        self._parent._childNodes[self._name] = self
+        self._parent._addChild(self._name, self)
+        self._changed()
 
 #    def getParent(self):
 #        """
@@ -83,10 +497,11 @@ class AddressNode(object):
 
 
     def _checkRemove(self):
-        if not self._parent:
+        if self._parent is None:
             return
         if not self._callbacks and not self._childNodes:
-            del self._parent._childNodes[self._name]
+            self._parent._removeChild(self._name)
+            self._parent._changed()
         self._parent._checkRemove()
 
 
@@ -114,84 +529,145 @@ class AddressNode(object):
         """
         Match a pattern to return a set of nodes.
 
+        An empty part before the last one, written C{//} in an OSC 1.1
+        address, matches any number of parts, in the pattern as well as
+        in the registered paths. The tree is walked once per pair of
+        node and position in the pattern, so that the subtrees already
+        visited are not walked again.
+
         @param pattern: A C{str} with an address pattern.
         @return a C{set()} of matched AddressNode instances.
         """
 
         path = self._patternPath(pattern)
-        if not len(path):
-            return set([self])
-
+        last = len(path) - 1
         matchedNodes = set()
+        visited = set()
+        pending = [(self, 0)]
+        while pending:
+            state = pending.pop()
+            if state in visited:
+                continue
+            visited.add(state)
+            node, depth = state
+            if depth > last:
+                matchedNodes.add(node)
+                continue
+            children = node._childNodes
+            if not children:
+                continue
+            part = path[depth]
+            if not part and depth < last:
+                # "//" matches this node and any of its descendants
+                pending.append((node, depth + 1))
+                for child in children.itervalues():
+                    pending.append((child, depth))
+                continue
 
-        part = path[0]
-        if AddressNode.isWildcard(part):
-            for c in self._childNodes:
-                if AddressNode.matchesWildcard(c, part):
-                    matchedNodes.add( self._childNodes[c] )
-            # FIXME - what if both the part and some of my childs have wildcards?
-        elif self._wildcardNodes:
-            matches = set()
-            for c in self._wildcardNodes:
-                if AddressNode.matchesWildcard(part, c):
-                    matchedNodes.add( self._childNodes[c] )
-                    break
-        if part in self._childNodes:
-            matchedNodes.add( self._childNodes[part] )
-
-        if not matchedNodes:
-            return matchedNodes
-        return reduce(lambda a, b: a.union(b), [n.match(path[1:]) for n in matchedNodes])
-
-
-    def addCallback(self, pattern, cb):
+            deep = children.get("")
+            if deep is not None and deep._childNodes:
+                # a registered "//" matches any number of parts
+                for skipped in range(depth, last + 1):
+                    pending.append((deep, skipped))
+
+            wildcards = node._wildcardNodes
+            if AddressNode.isWildcard(part):
+                # a child whose name is a wildcard too is matched if both
+                # wildcards match some value in common
+                matcher = AddressNode.compileWildcard(part)
+                for c, child in children.iteritems():
+                    if wildcards and c in wildcards:
+                        if AddressNode.wildcardsOverlap(part, c):
+                            pending.append((child, depth + 1))
+                    elif matcher(c):
+                        pending.append((child, depth + 1))
+            elif wildcards:
+                for c in wildcards.matches(part):
+                    pending.append((children[c], depth + 1))
+            if part in children:
+                pending.append((children[part], depth + 1))
+        return matchedNodes
+
+
+    def addCallback(self, pattern, cb, priority=0):
         """
         Adds a callback for L{txosc.osc.Message} instances received for a given OSC path, relative to this node's address as its root. 
 
         In the OSC protocol, only leaf nodes can have callbacks, though this implementation allows also branch nodes to have callbacks.
 
+        The nodes of the path are looked up and created in a single
+        pass. The path is validated before any node is created.
+
+        The callbacks matching a message are called by decreasing
+        priority, and in the order they were added for equal priorities,
+        whichever nodes they are bound to. Adding a callback which is
+        already bound to the path does nothing.
+
         @param path: OSC address in the form C{/egg/spam/ham}, or list C{['egg', 'spam', 'ham']}.
         @type pattern: C{str} or C{list}.
         @param cb: Callback that will receive L{Message} as an argument when received.
         @type cb: Function or method.
+        @param priority: The priority of the callback.
+        @type priority: C{int}
         @return: None
         """
         path = self._patternPath(pattern)
-        if not len(path):
-            self._callbacks.add(cb)
-        else:
-            part = path[0]
-            if part not in self._childNodes:
-                if not AddressNode.isValidAddressPart(part):
-                    raise ValueError("Invalid address part: '%s'" % part)
-                self.addNode(part, AddressNode())
-                if AddressNode.isWildcard(part):
-                    self._wildcardNodes.add(part)
-            self._childNodes[part].addCallback(path[1:], cb)
+        node = self
+        depth = 0
+        while depth < len(path) and node._childNodes and path[depth] in node._childNodes:
+            node = node._childNodes[path[depth]]
+            depth += 1
+        missing = path[depth:]
+        for part in missing:
+            if not AddressNode.isValidAddressPart(part):
+                raise ValueError("Invalid address part: '%s'" % part)
+            if AddressNode.isWildcard(part):
+                AddressNode.compileWildcard(part)
+        for part in missing:
+            child = AddressNode(part)
+            child._parent = node
+            node._addChild(part, child)
+            node = child
+        if cb not in node._callbacks:
+            key = _registrationCounter.next() - priority * _PRIORITY_STEP
+            index = bisect.bisect(node._order, key)
+            node._order = node._order[:index] + (key,) + node._order[index:]
+            node._callbacks = node._callbacks[:index] + (cb,) + node._callbacks[index:]
+        node._changed()
 
 
     def removeCallback(self, pattern, cb):
         """
         Removes a callback for L{Message} instances received for a given OSC path.
 
+        The nodes left without callbacks nor children are removed.
+
         @param path: OSC address in the form C{/egg/spam/ham}, or list C{['egg', 'spam', 'ham']}.
         @type pattern: C{str} or C{list}.
         @param cb: Callback that will receive L{txosc.osc.Message} as an argument when received.
         @type cb: A callable object.
+        @raise KeyError: If the callback is not bound to this path.
         """
         path = self._patternPath(pattern)
-        if not len(path):
-            self._callbacks.remove(cb)
-        else:
-            part = path[0]
-            if part not in self._childNodes:
+        nodes = [self]
+        for part in path:
+            children = nodes[-1]._childNodes
+            if not children or part not in children:
                 raise KeyError("No such address part: " + part)
-            self._childNodes[part].removeCallback(path[1:], cb)
-            if not self._childNodes[part]._callbacks and not self._childNodes[part]._childNodes:
-                # remove child
-                if part in self._wildcardNodes:
-                    self._wildcardNodes.remove(part)
-                del self._childNodes[part]
+            nodes.append(children[part])
+        node = nodes[-1]
+        if cb not in node._callbacks:
+            raise KeyError(cb)
+        index = node._callbacks.index(cb)
+        node._callbacks = node._callbacks[:index] + node._callbacks[index + 1:]
+        node._order = node._order[:index] + node._order[index + 1:]
+        node._changed()
+        for depth in range(len(path) - 1, -1, -1):
+            child = nodes[depth + 1]
+            if child._callbacks or child._childNodes:
+                break
+            nodes[depth]._removeChild(path[depth])
+            nodes[depth]._changed()
 
 
     @staticmethod
@@ -199,8 +675,7 @@ class AddressNode(object):
         """
         Given a name, returns whether it contains wildcard characters.
         """
-        wildcardChars = set("*?[]{}")
-        return len(set(name).intersection(wildcardChars)) > 0
+        return _wildcardChars.search(name) is not None
 
 
     @staticmethod
@@ -209,8 +684,7 @@ class AddressNode(object):
         Check whether the address part can be used as an L{AddressNode} name.
         @rtype bool
         """
-        invalidChars = set(" #,/")
-        return len(set(part).intersection(invalidChars)) == 0
+        return _invalidChars.search(part) is None
 
 
     @staticmethod
@@ -218,41 +692,66 @@ class AddressNode(object):
         """
         Match a value to a wildcard.
         """
-        if value == wildcard and not AddressNode.isWildcard(wildcard):
-            return True
-        if wildcard == "*":
-            return True
+        return bool(AddressNode.compileWildcard(wildcard)(value))
 
-        wildcard = wildcard.replace("*", ".*")
-        wildcard = wildcard.replace("?", ".?")
-        wildcard = wildcard.replace("[!", "[^")
-        wildcard = wildcard.replace("(", "\(")
-        wildcard = wildcard.replace(")", "\)")
-        wildcard = wildcard.replace("|", "\|")
-        wildcard = wildcard.replace("{", "(")
-        wildcard = wildcard.replace("}", ")")
-        wildcard = wildcard.replace(",", "|")
-        wildcard = "^" + wildcard + "$"
 
-        try:
-            r = re.compile(wildcard)
-            return re.match(wildcard, value) is not None
-        except:
-            raise OscError("Invalid character in wildcard.")
+    @staticmethod
+    def compileWildcard(wildcard):
+        """
+        Returns a matcher for the given wildcard.
+
+        The matcher is a callable which takes a value and returns
+        whether it matches the wildcard. Wildcards made of C{*} and
+        literal characters, and those with a single C{?}, are matched
+        with string methods. The others are translated to a compiled
+        regular expression. Matchers are kept in the bounded
+        L{wildcardCache}.
+
+        @param wildcard: An address part, e.g. C{"foo*"}.
+        @type wildcard: C{str}
+        @raise OscError: If the wildcard is invalid.
+        """
+        matcher = wildcardCache.get(wildcard)
+        if matcher is None:
+            matcher = _compileWildcard(wildcard)
+            wildcardCache.set(wildcard, matcher)
+        return matcher
+
+
+    @staticmethod
+    def wildcardsOverlap(first, second):
+        """
+        Returns whether two wildcards match at least one value in
+        common. For example, C{"foo*"} and C{"*bar"} both match
+        C{"foobar"}. The results are kept in the L{wildcardCache}.
+
+        @type first: C{str}
+        @type second: C{str}
+        @rtype: C{bool}
+        @raise OscError: If a wildcard is invalid.
+        """
+        key = (first, second)
+        result = wildcardCache.get(key)
+        if result is None:
+            result = _automataOverlap(_WildcardAutomaton(first), _WildcardAutomaton(second))
+            wildcardCache.set(key, result)
+        return result
 
 
     def _patternPath(self, pattern):
         """
-        Given a OSC address path like /foo/bar, return a list of
-        ['foo', 'bar']. Note that an OSC address always starts with a
-        slash. If a list is input, it is output directly.
+        Given a OSC address path like /foo/bar, return a tuple of
+        ('foo', 'bar'). Note that an OSC address always starts with a
+        slash. If a list or a tuple is input, it is output directly.
+
+        The parts of an address are cached, see L{txosc.osc.getAddressPath}.
 
         @param pattern: A L{str} OSC address.
-        @return: A L{list} of L{str}. Each part of an OSC path.
+        @return: A L{tuple} of L{str}. Each part of an OSC path.
         """
-        if type(pattern) == list:
+        if type(pattern) in (list, tuple):
             return pattern
-        return pattern.split("/")[1:]
+        return getAddressPath(pattern)[1]
 
 
     def removeCallbacksByPattern(self, pattern):
@@ -268,9 +767,11 @@ class AddressNode(object):
         """
         Remove all callbacks from this node.
         """
-        self._childNodes = {}
-        self._wildcardNodes = set()
-        self._callbacks = set()
+        self._childNodes = None
+        self._wildcardNodes = None
+        self._callbacks = ()
+        self._order = ()
+        self._changed()
         self._checkRemove()
 
 
@@ -288,11 +789,421 @@ class AddressNode(object):
         pattern. Returns a set() of callables.
         @return: L{set} of callbables.
         """
+        if type(pattern) is str:
+            return set(self.resolveCallbacks(pattern))
+        return self._matchCallbacks(pattern)
+
+
+    def resolveCallbacks(self, address):
+        """
+        Returns the callbacks bound to an address, using the cache of
+        this node.
+
+        Until the tree is changed, the callbacks of an address are only
+        looked up once, so that dispatching to a hot address costs a
+        single dictionary lookup.
+
+        @param address: A C{str} with an OSC address or address pattern.
+        @return: A C{tuple} of callables, in the order they should be called.
+        """
+        cache = self._callbackCache
+        if cache is None:
+            cache = self._callbackCache = LRUCache(self.callbackCacheSize)
+        if self._cacheGeneration != self._generation:
+            cache.clear()
+            self._cacheGeneration = self._generation
+        callbacks = cache.get(address)
+        if callbacks is None:
+            callbacks = _mergeEntries([node._entries() for node in self.match(address)])
+            cache.set(address, callbacks)
+        return callbacks
+
+
+    def getCacheStats(self):
+        """
+        Returns the counters of the callback cache of this node, see
+        L{txosc.osc.LRUCache.getStats}, and its generation counter.
+
+        @rtype: C{dict}
+        """
+        if self._callbackCache is None:
+            stats = LRUCache(self.callbackCacheSize).getStats()
+        else:
+            stats = self._callbackCache.getStats()
+        stats["generation"] = self._generation
+        return stats
+
+
+    def _matchCallbacks(self, pattern):
+        """
+        Walks the tree to find the callbacks bound to a pattern.
+
+        @return: L{set} of callables.
+        """
         path = self._patternPath(pattern)
-        nodes = self.match(path)
-        if not nodes:
-            return nodes
-        return reduce(lambda a, b: a.union(b), [n._callbacks for n in nodes])
+        callbacks = set()
+        for node in self.match(path):
+            callbacks.update(node._callbacks)
+        return callbacks
+
+
+    def _entries(self):
+        """
+        Returns the callbacks of this node, with their sort keys.
+
+        @return: A sorted C{list} of two-item tuples, with a sort key and a callback.
+        """
+        return zip(self._order, self._callbacks)
+
+
+    def _iterRegistrations(self, path=()):
+        """
+        Iterates over the nodes of this tree which have callbacks.
+
+        @return: An iterator of two-item tuples, with the path of a node,
+        relative to this node, and its callbacks, see L{_entries}.
+        """
+        if self._callbacks:
+            yield path, self._entries()
+        if not self._childNodes:
+            return
+        for name, child in self._childNodes.iteritems():
+            for item in child._iterRegistrations(path + (name,)):
+                yield item
+
+
+
+class DispatchTable(object):
+    """
+    An immutable snapshot of the callbacks of a tree of L{AddressNode}
+    instances, see L{Receiver.compile}.
+
+    The callbacks of literal paths are stored in a flat C{dict}. The
+    paths which contain wildcards are grouped by number of parts, and
+    indexed by one of their parts, their last literal part if any, so
+    that only a few candidates are tried for an address. The paths
+    which contain C{//} are kept apart, and matched part by part.
+    Resolving an address never walks the tree, and the results are cached.
+    """
+
+    def __init__(self, registrations, cacheSize=1024):
+        """
+        @param registrations: An iterable of two-item tuples, with the
+        C{tuple} of the parts of a path, and a sorted C{list} of
+        callbacks with their sort keys, see L{AddressNode._entries}.
+        @param cacheSize: The maximum number of addresses whose callbacks are cached.
+        """
+        self._literals = {}
+        self._anchors = {}
+        self._paths = []
+        self._deepPaths = []
+        for path, callbacks in registrations:
+            depth = len(path)
+            self._paths.append((path, callbacks))
+            if _isDeep(path):
+                self._deepPaths.append((path, callbacks))
+                continue
+            literals = [i for i, part in enumerate(path) if not AddressNode.isWildcard(part)]
+            if len(literals) == depth:
+                self._literals[path] = callbacks
+                continue
+            matchers = tuple([AddressNode.compileWildcard(part) for part in path])
+            if literals:
+                position = literals[-1]
+            else:
+                position = depth - 1
+            index, entries = self._anchors.setdefault(depth, {}).setdefault(
+                position, (_WildcardIndex(), {}))
+            anchor = path[position]
+            if anchor not in index:
+                index.add(anchor, matchers[position])
+            entries.setdefault(anchor, []).append((matchers, callbacks))
+        self._cache = LRUCache(cacheSize)
+
+
+    def resolveCallbacks(self, address):
+        """
+        Returns the callbacks bound to an address.
+
+        @param address: A C{str} with an OSC address or address pattern.
+        @return: A C{tuple} of callables.
+        """
+        callbacks = self._cache.get(address)
+        if callbacks is None:
+            path = getAddressPath(address)[1]
+            if _wildcardChars.search(address) or _isDeep(path):
+                callbacks = self._matchPattern(path)
+            else:
+                callbacks = self._matchAddress(path)
+            self._cache.set(address, callbacks)
+        return callbacks
+
+
+    def getCacheStats(self):
+        """
+        Returns the counters of the cache of this table, see
+        L{txosc.osc.LRUCache.getStats}.
+        """
+        return self._cache.getStats()
+
+
+    def _matchAddress(self, path):
+        """
+        Returns the callbacks for a path without wildcards.
+        """
+        found = []
+        if path in self._literals:
+            found.append(self._literals[path])
+        anchors = self._anchors.get(len(path))
+        if anchors:
+            for position, (index, entries) in anchors.iteritems():
+                for anchor in index.matches(path[position]):
+                    for matchers, callbacks in entries[anchor]:
+                        for matcher, part in zip(matchers, path):
+                            if not matcher(part):
+                                break
+                        else:
+                            found.append(callbacks)
+        for registered, callbacks in self._deepPaths:
+            if _pathsMatch(path, registered):
+                found.append(callbacks)
+        return _mergeEntries(found)
+
+
+    def _matchPattern(self, path):
+        """
+        Returns the callbacks for a path with wildcards, which are
+        matched against the registered names, as L{AddressNode.match} does.
+        """
+        found = []
+        for registered, callbacks in self._paths:
+            if _pathsMatch(path, registered):
+                found.append(callbacks)
+        return _mergeEntries(found)
+
+
+
+def _isDeep(path):
+    """
+    Returns whether a path contains C{//}, that is an empty part before its last part.
+    """
+    return "" in path[:-1]
+
+
+def _partsMatch(part, name):
+    """
+    Returns whether a part of an address pattern matches the name of a
+    registered node, as L{AddressNode.match} does.
+    """
+    if part == name:
+        return True
+    if AddressNode.isWildcard(name):
+        if AddressNode.isWildcard(part):
+            return AddressNode.wildcardsOverlap(part, name)
+        return bool(AddressNode.compileWildcard(name)(part))
+    return AddressNode.isWildcard(part) and bool(AddressNode.compileWildcard(part)(name))
+
+
+def _pathsMatch(path, registered):
+    """
+    Returns whether the parts of an address pattern match a registered
+    path, where C{//} on either side matches any number of parts.
+    """
+    memo = {}
+    lastPart = len(path) - 1
+    lastName = len(registered) - 1
+
+    def match(i, j):
+        key = (i, j)
+        if key not in memo:
+            memo[key] = step(i, j)
+        return memo[key]
+
+    def step(i, j):
+        if i > lastPart and j > lastName:
+            return True
+        if i < lastPart and not path[i]:
+            if match(i + 1, j) or (j <= lastName and match(i, j + 1)):
+                return True
+        if j < lastName and not registered[j]:
+            if match(i, j + 1) or (i < lastPart and match(i + 1, j)):
+                return True
+        if i > lastPart or j > lastName:
+            return False
+        if (i < lastPart and not path[i]) or (j < lastName and not registered[j]):
+            return False
+        return _partsMatch(path[i], registered[j]) and match(i + 1, j + 1)
+
+    return match(0, 0)
+
+
+
+def _mergeEntries(entries):
+    """
+    Merges sorted lists of callbacks with their sort keys, see
+    L{AddressNode._entries}.
+
+    @return: A C{tuple} of callbacks, in order, without duplicates.
+    """
+    if len(entries) == 1:
+        return tuple([callback for key, callback in entries[0]])
+    seen = set()
+    callbacks = []
+    for key, callback in heapq.merge(*entries):
+        if callback not in seen:
+            seen.add(callback)
+            callbacks.append(callback)
+    return tuple(callbacks)
+
+
+
+LATE_RUN = "run"
+LATE_DROP = "drop"
+LATE_COUNT = "count"
+
+
+class BundleScheduler(object):
+    """
+    Holds the messages of bundles until the time of their time tag.
+
+    Pending messages are kept in a heap, ordered by time and then by
+    arrival, and a single timer of the reactor is armed for the earliest
+    one, however many are pending.
+
+    A message whose time has already passed by more than C{tolerance}
+    when it is scheduled is late. Late messages are handled according
+    to the late policy:
+     - C{LATE_RUN}: they are dispatched at once.
+     - C{LATE_DROP}: they are discarded.
+     - C{LATE_COUNT}: they are dispatched at once, and their lateness
+       is added to the statistics, see L{getStats}.
+
+    @ivar late: The number of late messages.
+    @ivar dropped: The number of late messages which were discarded.
+    """
+
+    def __init__(self, dispatch, clock=None, latePolicy=LATE_RUN, tolerance=0.0):
+        """
+        @param dispatch: Callable called with a message and its client when it is due.
+        @param clock: A provider of
+        L{twisted.internet.interfaces.IReactorTime}, such as
+        L{twisted.internet.task.Clock}. Its C{seconds()} must be
+        comparable to C{time.time()}. Defaults to the reactor.
+        @param latePolicy: One of C{LATE_RUN}, C{LATE_DROP} or C{LATE_COUNT}.
+        @param tolerance: How late, in seconds, a message can be without being late.
+        @raise ValueError: If the late policy is unknown.
+        """
+        if latePolicy not in (LATE_RUN, LATE_DROP, LATE_COUNT):
+            raise ValueError("Unknown late policy: %r" % (latePolicy,))
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._dispatch = dispatch
+        self.clock = clock
+        self.latePolicy = latePolicy
+        self.tolerance = tolerance
+        self._pending = []
+        self._counter = itertools.count()
+        self._call = None
+        self._callTime = None
+        self.late = 0
+        self.dropped = 0
+        self._lateness = 0.0
+        self._maxLateness = 0.0
+
+
+    def schedule(self, when, message, client):
+        """
+        Dispatches a message at the given time.
+
+        @param when: Time as returned by C{time.time()}, see L{txosc.osc.timeTagToTime}.
+        @type when: C{float}
+        @param message: A L{Message}.
+        @param client: See L{Receiver.dispatch}.
+        """
+        now = self.clock.seconds()
+        if when <= now:
+            lateness = now - when
+            if lateness > self.tolerance:
+                self.late += 1
+                if self.latePolicy == LATE_DROP:
+                    self.dropped += 1
+                    return
+                if self.latePolicy == LATE_COUNT:
+                    self._lateness += lateness
+                    self._maxLateness = max(self._maxLateness, lateness)
+            self._dispatch(message, client)
+            return
+        heapq.heappush(self._pending, (when, self._counter.next(), message, client))
+        if self._callTime is None or when < self._callTime:
+            self._arm(now)
+
+
+    def _arm(self, now):
+        """
+        Arms the timer for the earliest pending message, or cancels it.
+        """
+        if not self._pending:
+            if self._call is not None:
+                self._call.cancel()
+                self._call = None
+                self._callTime = None
+            return
+        when = self._pending[0][0]
+        delay = max(0.0, when - now)
+        if self._call is None:
+            self._call = self.clock.callLater(delay, self._run)
+        else:
+            self._call.reset(delay)
+        self._callTime = when
+
+
+    def _run(self):
+        """
+        Dispatches the messages which are due, and arms the timer again.
+        """
+        self._call = None
+        self._callTime = None
+        pending = self._pending
+        try:
+            while pending and pending[0][0] <= self.clock.seconds():
+                when, order, message, client = heapq.heappop(pending)
+                try:
+                    self._dispatch(message, client)
+                except Exception:
+                    from twisted.python import log
+                    log.err(None, "Error dispatching scheduled message %s" % (message,))
+        finally:
+            if self._call is None:
+                self._arm(self.clock.seconds())
+
+
+    def clear(self):
+        """
+        Discards all pending messages.
+        """
+        del self._pending[:]
+        self._arm(self.clock.seconds())
+
+
+    def __len__(self):
+        return len(self._pending)
+
+
+    def getStats(self):
+        """
+        Returns the statistics of this scheduler.
+
+        @return: A C{dict} with the number of C{pending}, C{late} and
+        C{dropped} messages, and the C{totalLateness} and C{maxLateness}
+        in seconds of the late messages counted with C{LATE_COUNT}.
+        """
+        return {
+            "pending": len(self._pending),
+            "late": self.late,
+            "dropped": self.dropped,
+            "totalLateness": self._lateness,
+            "maxLateness": self._maxLateness,
+            }
 
 
 
@@ -303,30 +1214,139 @@ class Receiver(AddressNode):
     registered callbacks.
 
     Callbacks are stored in a tree-like structure, using L{AddressNode} objects.
+    Once L{compile} has been called, messages are dispatched with a
+    L{DispatchTable} instead, which is compiled again after the tree changes.
     """
+    _table = None
+    _tableGeneration = 0
+    scheduler = None
+
+    def enableScheduling(self, clock=None, latePolicy=LATE_RUN, tolerance=0.0):
+        """
+        Dispatches the messages of bundles at the time of their time
+        tag from now on, instead of at once. The messages whose time
+        tag means "immediately", and those which are not in a bundle,
+        are still dispatched at once.
+
+        If scheduling was already enabled, the messages pending in the
+        previous scheduler are moved to the new one, and the timer of
+        the previous one is cancelled.
+
+        @param clock: See L{BundleScheduler}.
+        @param latePolicy: See L{BundleScheduler}.
+        @param tolerance: See L{BundleScheduler}.
+        @rtype: L{BundleScheduler}
+        """
+        previous = self.scheduler
+        self.scheduler = BundleScheduler(self._dispatchMessage, clock, latePolicy, tolerance)
+        if previous is not None:
+            pending = sorted(previous._pending)
+            previous.clear()
+            for when, order, message, client in pending:
+                self.scheduler.schedule(when, message, client)
+        return self.scheduler
+
+
+    def compile(self):
+        """
+        Compiles the callbacks of this receiver into a L{DispatchTable},
+        and uses it to dispatch messages from now on.
+
+        The table is an immutable snapshot. When the tree is changed,
+        for instance by a callback during dispatching, a new table is
+        compiled before the next message is dispatched, and replaces the
+        previous one at once.
+
+        @rtype: L{DispatchTable}
+        """
+        table = DispatchTable(self._iterRegistrations(), self.callbackCacheSize)
+        self._table = table
+        self._tableGeneration = self._generation
+        return table
+
+
+    def resolveCallbacks(self, address):
+        """
+        See L{AddressNode.resolveCallbacks}. Uses the L{DispatchTable}
+        of this receiver, if it has been compiled.
+        """
+        if self._table is None:
+            return AddressNode.resolveCallbacks(self, address)
+        if self._tableGeneration != self._generation:
+            self.compile()
+        return self._table.resolveCallbacks(address)
+
 
     def dispatch(self, element, client):
         """
         Dispatch an element to all matching callbacks.
 
         Executes every callback matching the message address with
-        element as argument. The order in which the callbacks are
-        called is undefined.
+        element as argument. The messages of a bundle are dispatched in
+        order. The callbacks of a message are called by decreasing
+        priority, then in the order they were added, see
+        L{AddressNode.addCallback}.
+
+        If scheduling is enabled, the messages of bundles are dispatched
+        at the time of their time tag, see L{enableScheduling}.
 
         @param element: A L{Message} or L{Bundle}.  
         @param client: Either a (host, port) tuple with the originator's address, or an instance of L{StreamBasedFactory} whose C{send()} method can be used to send a message back.
         """
         if isinstance(element, Bundle):
-            messages = element.getMessages()
+            for timeTag, m in element.iterMessages():
+                self._dispatchTimed(timeTag, m, client)
         else:
-            messages = [element]
-        for m in messages:
-            matched = False
-            for c in self.getCallbacks(m.address):
-                c(m, client)
-                matched = True
-            if not matched:
-                self.fallback(m, client)
+            self._dispatchMessage(element, client)
+
+
+    def dispatchBinary(self, data, client, lazy=False, arrays=False, limits=None):
+        """
+        Decode a packet and dispatch its messages as they are decoded.
+
+        The callbacks for the first messages of a bundle are called
+        before the rest of the bundle is parsed. See
+        L{txosc.osc.iterMessagesFromBinary}.
+
+        @param data: A C{str} with a binary L{Message} or L{Bundle}.
+        @param client: See L{dispatch}.
+        @param lazy: Whether messages should be L{txosc.osc.LazyMessage} instances.
+        @param arrays: See L{txosc.osc.Message.fromBinary}.
+        @param limits: The L{txosc.osc.DecodeLimits} to enforce, if any.
+        The size and the depth of the whole packet are checked before any
+        of its messages is dispatched, see
+        L{txosc.osc.DecodeLimits.checkPacket}. The other limits are
+        checked as the messages are decoded, so that a message which
+        exceeds them is dropped with the rest of the packet, after the
+        earlier messages have been dispatched.
+        @raise DecodeLimitError: If the packet exceeds the limits.
+        """
+        if limits is not None:
+            limits.checkPacket(data)
+        for timeTag, m in iterMessagesFromBinary(data, lazy, arrays, limits):
+            self._dispatchTimed(timeTag, m, client)
+
+
+    def _dispatchTimed(self, timeTag, message, client):
+        """
+        Dispatches a message at once, or schedules it for its time tag.
+        """
+        if self.scheduler is None or timeTag is True:
+            self._dispatchMessage(message, client)
+        else:
+            self.scheduler.schedule(timeTagToTime(timeTag), message, client)
+
+
+    def _dispatchMessage(self, message, client):
+        """
+        Dispatch a message to all matching callbacks, or to the fallback.
+        """
+        matched = False
+        for c in self.resolveCallbacks(message.address):
+            c(message, client)
+            matched = True
+        if not matched:
+            self.fallback(message, client)
 
     #TODO: add a addFallback or setFallback method
     def fallback(self, message, client):
@@ -18,6 +18,14 @@ import string
 import math
 import struct
 import re
+import sys
+import array
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class OscError(Exception):
@@ -27,6 +35,19 @@ class OscError(Exception):
     pass
 
 
+
+class DecodeLimitError(OscError):
+    """
+    Raised when a packet exceeds one of its L{DecodeLimits}.
+
+    @ivar limit: The name of the exceeded limit, e.g. C{"maxDepth"}.
+    """
+
+    def __init__(self, limit, message):
+        OscError.__init__(self, message)
+        self.limit = limit
+
+
 def getAddressParts(address):
     """
     Returns the list of the parts of an address.
@@ -38,6 +59,282 @@ def getAddressParts(address):
     return address.strip("/").split("/")
 
 
+class LRUCache(object):
+    """
+    A bounded mapping which discards its least recently used entries.
+
+    Each entry is stamped with a counter when it is used, so that a
+    lookup costs a single dictionary access. When the cache is full, the
+    least recently used eighth of the entries is discarded at once.
+
+    @ivar maxSize: The maximum number of entries.
+    @ivar hits: Number of successful lookups.
+    @ivar misses: Number of failed lookups.
+    @ivar evictions: Number of entries discarded to make room for new ones.
+    """
+
+    def __init__(self, maxSize=256):
+        """
+        @param maxSize: The maximum number of entries.
+        @type maxSize: C{int}
+        """
+        self.maxSize = maxSize
+        self._entries = {}
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value for C{key}, marking it as recently used.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._clock += 1
+        entry[1] = self._clock
+        self.hits += 1
+        return entry[0]
+
+
+    def set(self, key, value):
+        """
+        Stores C{value} for C{key}, discarding the least recently used
+        entries if the cache is full.
+        """
+        entries = self._entries
+        if key not in entries:
+            if self.maxSize <= 0:
+                return
+            if len(entries) >= self.maxSize:
+                self._evict(max(len(entries) - self.maxSize + 1, self.maxSize // 8))
+        self._clock += 1
+        entries[key] = [value, self._clock]
+
+
+    def setMaxSize(self, maxSize):
+        """
+        Changes the maximum number of entries, discarding entries if needed.
+        """
+        self.maxSize = maxSize
+        if len(self._entries) > maxSize:
+            self._evict(len(self._entries) - max(maxSize, 0))
+
+
+    def _evict(self, count):
+        entries = self._entries
+        for key, entry in heapq.nsmallest(count, entries.iteritems(), key=lambda item: item[1][1]):
+            del entries[key]
+        self.evictions += count
+
+
+    def clear(self):
+        """
+        Discards all the entries. The counters are kept.
+        """
+        self._entries.clear()
+
+
+    def getStats(self):
+        """
+        Returns the counters of this cache.
+
+        @rtype: C{dict}
+        """
+        return {
+            "size": len(self._entries),
+            "maxSize": self.maxSize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            }
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+addressCache = LRUCache(maxSize=4096)
+
+
+def getAddressPath(address):
+    """
+    Returns the interned address and the tuple of its parts.
+
+    The results are kept in the bounded L{addressCache}, which is shared
+    by the decoders and by L{txosc.dispatch}, so that the same address
+    received many times is only allocated and split once. Use
+    L{setAddressCacheSize} to change its size.
+
+    @param address: An OSC address, e.g. C{"/foo/bar"}.
+    @type address: C{str}
+    @return: Two-item tuple with the address, and the tuple of its
+    parts, e.g. C{("foo", "bar")}.
+    """
+    entry = addressCache.get(address)
+    if entry is None:
+        if type(address) is str:
+            address = intern(address)
+        entry = (address, tuple(address.split("/")[1:]))
+        addressCache.set(address, entry)
+    return entry
+
+
+def setAddressCacheSize(maxSize):
+    """
+    Changes the number of addresses kept by L{getAddressPath}.
+
+    The least recently received addresses are evicted first. A size of
+    zero disables the cache.
+
+    @type maxSize: C{int}
+    """
+    addressCache.setMaxSize(maxSize)
+
+
+
+class DecodeLimits(object):
+    """
+    Limits on the resources used to decode packets from untrusted peers.
+
+    The limits are checked while parsing, before the data they guard is
+    allocated or recursed into. A packet which exceeds one of them is
+    rejected with a L{DecodeLimitError}, and the violation is counted.
+    Since L{iterMessagesFromBinary} yields messages as it parses them,
+    the messages before a violation have already been yielded. Call
+    L{checkPacket} first so that a packet which is too large or too
+    deeply nested is rejected as a whole. The argument and blob limits
+    are checked on each message as it is parsed, which drops that
+    message and the rest of the packet.
+
+    @ivar maxPacketSize: The maximum size of a packet, in bytes. For
+        stream-based protocols, it is checked against the size prefix of
+        each packet, before buffering it.
+    @ivar maxDepth: The maximum nesting depth of bundles. A bundle which
+        is not in another bundle has a depth of 1.
+    @ivar maxArguments: The maximum number of type tags of a message, or
+        C{None} for no other limit than C{maxPacketSize}, which already
+        bounds the length of the type tags. Frames of floats, such as
+        for LED strips, commonly have thousands of arguments.
+    @ivar maxBlobBytes: The maximum total size of the blobs of a packet.
+        The blobs of L{LazyMessage} instances are not decoded while
+        parsing, only their sizes are read to be checked.
+    @ivar violations: A C{dict} with the number of rejected packets for
+        each of the limits above.
+    """
+
+    def __init__(self, maxPacketSize=1 << 20, maxDepth=32, maxArguments=None, maxBlobBytes=1 << 20):
+        self.maxPacketSize = maxPacketSize
+        self.maxDepth = maxDepth
+        self.maxArguments = maxArguments
+        self.maxBlobBytes = maxBlobBytes
+        self.violations = {
+            "maxPacketSize": 0,
+            "maxDepth": 0,
+            "maxArguments": 0,
+            "maxBlobBytes": 0,
+            }
+        self._blobBytes = 0
+
+
+    def checkPacketSize(self, size):
+        """
+        Checks the size of a packet, and starts counting its blob bytes.
+
+        @raise DecodeLimitError: If the packet is too large.
+        """
+        if size > self.maxPacketSize:
+            self._reject("maxPacketSize", "Packet of %d bytes exceeds %d bytes." % (size, self.maxPacketSize))
+        self._blobBytes = 0
+
+
+    def checkPacket(self, data):
+        """
+        Checks the size and the bundle depth of a whole packet, before
+        any of its messages is used.
+
+        Only the bundle headers and the sizes of the bundle elements are
+        read. Messages are skipped without parsing them, since their
+        arguments and blobs are checked by the decoding pass itself.
+
+        @param data: A C{str} with a L{Message} or a L{Bundle}.
+        @raise DecodeLimitError: If the packet is too large or its
+        bundles are nested too deeply.
+        @raise OscError: If the bundles are malformed.
+        """
+        self.checkPacketSize(len(data))
+        self._checkBundles(data, 0, len(data), 0)
+
+
+    def _checkBundles(self, data, offset, end, depth):
+        """
+        Checks the depth of the bundle found between C{offset} and C{end}
+        in C{data}, if any, and of the bundles it contains.
+
+        @param depth: The nesting depth of the enclosing bundle.
+        """
+        if data[offset:offset + 1] != "#":
+            return
+        depth += 1
+        self._checkDepth(depth)
+        timeTag, offset = _bundleHeaderFromBuffer(data, offset, end)
+        while offset < end:
+            offset, stop = _bundleElementFromBuffer(data, offset, end)
+            if data[offset:offset + 1] == "#":
+                self._checkBundles(data, offset, stop, depth)
+            offset = stop
+
+
+    def _checkDepth(self, depth):
+        if depth > self.maxDepth:
+            self._reject("maxDepth", "Bundles nested deeper than %d levels." % (self.maxDepth))
+
+
+    def _checkArguments(self, typeTags):
+        if self.maxArguments is not None and len(typeTags) > self.maxArguments:
+            self._reject("maxArguments", "Message with %d type tags exceeds %d." % (len(typeTags), self.maxArguments))
+
+
+    def _checkBlob(self, data, offset, end):
+        """
+        Checks the size of the blob at C{offset} in C{data}, before it is sliced.
+
+        @return: The position of the beginning of the next data.
+        @raise OscError: If the blob is truncated.
+        """
+        if offset + 4 > end:
+            raise OscError("Not enough bytes to find size of a blob argument in %s." % (data[offset:end]))
+        length = _int32.unpack_from(data, offset)[0]
+        if length < 0 or offset + 4 + length > end:
+            raise OscError("Not enough bytes to find size of a blob of size %s in %s." % (length, data[offset:end]))
+        self._blobBytes += length
+        if self._blobBytes > self.maxBlobBytes:
+            self._reject("maxBlobBytes", "Blobs of packet exceed %d bytes." % (self.maxBlobBytes))
+        return offset + 4 + _ceilToMultipleOfFour(length)
+
+
+    def _reject(self, limit, message):
+        self.violations[limit] += 1
+        raise DecodeLimitError(limit, message)
+
+
+    def getStats(self):
+        """
+        Returns the number of violations of each limit.
+
+        @rtype: C{dict}
+        """
+        return dict(self.violations)
+
+
+
 class Message(object):
     """
     An OSC Message element.
@@ -59,9 +356,40 @@ class Message(object):
         """
         Encodes the L{Message} to binary form, ready to send over the wire.
 
+        The total size is computed first, so that the whole message is
+        written into a single preallocated buffer.
+
         @return: A string with the binary presentation of this L{Message}.
         """
-        return StringArgument(self.address).toBinary() + StringArgument("," + self.getTypeTags()).toBinary() + "".join([a.toBinary() for a in self.arguments])
+        buf = bytearray(self.getBinarySize())
+        self._packInto(buf, 0)
+        return str(buf)
+
+
+    def getBinarySize(self):
+        """
+        Returns the size of the binary form of this L{Message}, without encoding it.
+
+        @rtype: C{int}
+        """
+        size = _getHeaderSize(self.address, self.getTypeTags())
+        for a in self.arguments:
+            size += a.getBinarySize()
+        return size
+
+
+    def _packInto(self, buf, offset):
+        """
+        Writes the binary form of this L{Message} into C{buf}.
+
+        @param buf: A C{bytearray} large enough to hold the message.
+        @param offset: Position in C{buf} where to start writing.
+        @return: The position right after the written data.
+        """
+        offset = _packHeaderInto(buf, offset, self.address, self.getTypeTags())
+        for a in self.arguments:
+            offset = a._packInto(buf, offset)
+        return offset
 
 
     def getTypeTags(self):
@@ -85,8 +413,17 @@ class Message(object):
         self.arguments.append(value)
 
 
+    def freeze(self):
+        """
+        Returns an immutable copy of this message, see L{FrozenMessage}.
+
+        @rtype: L{FrozenMessage}
+        """
+        return FrozenMessage(self.address, *self.arguments)
+
+
     @staticmethod
-    def fromBinary(data):
+    def fromBinary(data, arrays=False):
         """
         Creates a L{Message} object from binary data that is passed to it.
 
@@ -96,22 +433,33 @@ class Message(object):
 
         @param data: String of bytes/characters formatted following the OSC protocol.
         @type data: C{str}
+        @param arrays: Whether runs of float or integer arguments should be
+        decoded as L{TypedArrayArgument} instances. See L{TypeTagCodec}.
         @return: Two-item tuple with L{Message} as the first item, and the
         leftover binary data, as a L{str}.
         """
-        osc_address, leftover = _stringFromBinary(data)
-        message = Message(osc_address)
-        type_tags, leftover = _stringFromBinary(leftover)
+        message, offset = Message._fromBuffer(data, 0, len(data), arrays)
+        return message, data[offset:]
 
-        if type_tags[0] != ",":
-            # invalid type tag string
-            raise OscError("Invalid typetag string: %s" % type_tags)
 
-        for type_tag in type_tags[1:]:
-            arg, leftover = _argumentFromBinary(type_tag, leftover)
-            message.arguments.append(arg)
+    @staticmethod
+    def _fromBuffer(data, offset, end, arrays=False, limits=None):
+        """
+        Parses a L{Message} from C{data}, between C{offset} and C{end}.
+
+        The data is never sliced, except to extract the final values.
 
-        return message, leftover
+        @param limits: The L{DecodeLimits} to enforce, if any.
+        @return: Two-item tuple with L{Message} as the first item, and the
+        position right after the parsed message as the second.
+        """
+        osc_address, type_tags, offset = _messageHeaderFromBuffer(data, offset, end)
+        if limits is not None:
+            limits._checkArguments(type_tags)
+        message = Message(osc_address)
+        codec = getTypeTagCodec(type_tags, arrays)
+        message.arguments, offset = codec.decodeArguments(data, offset, end, limits)
+        return message, offset
 
 
     def __str__(self):
@@ -129,7 +477,9 @@ class Message(object):
         return [arg.value for arg in self.arguments]
 
     def __eq__(self, other):
-        if not isinstance(other, type(self)):
+        if isinstance(other, CompactMessage):
+            return other == self
+        if not isinstance(other, Message):
             return False
         if self.address != other.address:
             return False
@@ -146,6 +496,221 @@ class Message(object):
         return not (self == other)
 
 
+
+class LazyMessage(Message):
+    """
+    An OSC L{Message} whose arguments are decoded on first access.
+
+    Only the address and the type tags are parsed when it is created.
+    The binary data is retained, and the L{Argument} instances are only
+    created when the C{arguments} attribute is read, for example by
+    L{getValues}. This is cheap for messages which are only routed by
+    their address, or dropped.
+
+    Note that errors in the argument data are only detected when the
+    arguments are decoded.
+    """
+
+    def __init__(self, address, codec, data, offset, end):
+        """
+        @param address: The OSC address string.
+        @param codec: The L{TypeTagCodec} for the type tags of the message.
+        @param data: The binary data containing the arguments.
+        @param offset: Position of the first argument in C{data}.
+        @param end: Position of the end of the message in C{data}.
+        """
+        self.address = address
+        self._codec = codec
+        self._data = data
+        self._offset = offset
+        self._end = end
+        self._arguments = None
+
+
+    def _getArguments(self):
+        if self._arguments is None:
+            self._arguments = self._codec.decodeArguments(self._data, self._offset, self._end)[0]
+            self._data = None
+        return self._arguments
+
+
+    def _setArguments(self, arguments):
+        self._arguments = arguments
+        self._data = None
+
+    arguments = property(_getArguments, _setArguments)
+
+
+    def __str__(self):
+        """
+        Shows the address and the type tags, without decoding the
+        arguments, unless they have already been decoded.
+        """
+        if self._arguments is not None:
+            return Message.__str__(self)
+        s = self.address
+        if self._codec.typeTags:
+            s += " ,%s" % (self._codec.typeTags)
+        return s
+
+
+    def getTypeTags(self):
+        """
+        See L{Message.getTypeTags}. Does not decode the arguments.
+        """
+        if self._arguments is None:
+            return self._codec.typeTags
+        return Message.getTypeTags(self)
+
+
+    @staticmethod
+    def fromBinary(data, arrays=False):
+        """
+        Creates a L{LazyMessage} object from binary data that is passed to it.
+
+        @param data: String of bytes/characters formatted following the OSC protocol.
+        @type data: C{str}
+        @param arrays: See L{Message.fromBinary}.
+        @return: Two-item tuple with L{LazyMessage} as the first item, and
+        an empty leftover, since all the data is retained for the arguments.
+        """
+        message, offset = LazyMessage._fromBuffer(data, 0, len(data), arrays)
+        return message, data[offset:]
+
+
+    @staticmethod
+    def _fromBuffer(data, offset, end, arrays=False, limits=None):
+        """
+        Parses the address and type tags of a L{LazyMessage}.
+
+        @return: Two-item tuple with L{LazyMessage} as the first item, and C{end}.
+        """
+        osc_address, type_tags, offset = _messageHeaderFromBuffer(data, offset, end)
+        codec = getTypeTagCodec(type_tags, arrays)
+        if limits is not None:
+            limits._checkArguments(type_tags)
+            if "b" in type_tags:
+                codec.checkBlobs(data, offset, end, limits)
+        return LazyMessage(osc_address, codec, data, offset, end), end
+
+
+
+class CompactMessage(object):
+    """
+    A memory-efficient OSC message, which only stores its address, its
+    type tags and a tuple of values.
+
+    Unlike L{Message}, it does not create an L{Argument} instance per
+    value, and has no instance dictionary. It can be converted to and
+    from a L{Message} when needed, and be added to a L{Bundle}.
+
+    @ivar address: The OSC address string, e.g. C{"/foo/bar"}.
+    @ivar typeTags: The type tags, without the leading comma.
+    @ivar values: A C{tuple} with one value per type tag.
+    """
+    __slots__ = ("address", "typeTags", "values")
+
+    def __init__(self, address, typeTags="", values=()):
+        self.address = address
+        self.typeTags = typeTags
+        self.values = tuple(values)
+
+
+    @staticmethod
+    def fromMessage(message):
+        """
+        Creates a L{CompactMessage} from a L{Message}.
+        """
+        return CompactMessage(message.address, message.getTypeTags(), message.getValues())
+
+
+    def toMessage(self):
+        """
+        Creates a L{Message} with the same address and arguments.
+
+        @rtype: L{Message}
+        """
+        return Message(self.address, *getTypeTagCodec(self.typeTags).createArguments(self.values))
+
+
+    def freeze(self):
+        """
+        See L{Message.freeze}.
+        """
+        return FrozenMessage(self.address, *getTypeTagCodec(self.typeTags).createArguments(self.values))
+
+
+    def getTypeTags(self):
+        """
+        See L{Message.getTypeTags}.
+        """
+        return self.typeTags
+
+
+    def getValues(self):
+        """
+        See L{Message.getValues}.
+        """
+        return list(self.values)
+
+
+    def toBinary(self):
+        """
+        See L{Message.toBinary}.
+        """
+        buf = bytearray(self.getBinarySize())
+        self._packInto(buf, 0)
+        return str(buf)
+
+
+    def getBinarySize(self):
+        """
+        See L{Message.getBinarySize}.
+        """
+        return _getHeaderSize(self.address, self.typeTags) + getTypeTagCodec(self.typeTags).getBinarySize(self.values)
+
+
+    def _packInto(self, buf, offset):
+        offset = _packHeaderInto(buf, offset, self.address, self.typeTags)
+        return getTypeTagCodec(self.typeTags).packInto(buf, offset, self.values)
+
+
+    @staticmethod
+    def fromBinary(data):
+        """
+        Creates a L{CompactMessage} object from binary data that is passed to it.
+
+        @return: Two-item tuple with L{CompactMessage} as the first item,
+        and the leftover binary data, as a L{str}.
+        """
+        message, offset = CompactMessage._fromBuffer(data, 0, len(data))
+        return message, data[offset:]
+
+
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        osc_address, type_tags, offset = _messageHeaderFromBuffer(data, offset, end)
+        values, offset = getTypeTagCodec(type_tags).decodeValues(data, offset, end)
+        return CompactMessage(osc_address, type_tags, values), offset
+
+
+    def __str__(self):
+        return str(self.toMessage())
+
+
+    def __eq__(self, other):
+        if not isinstance(other, (CompactMessage, Message)):
+            return False
+        return (self.address == other.address
+            and self.getTypeTags() == other.getTypeTags()
+            and self.getValues() == other.getValues())
+
+
+    def __ne__(self, other):
+        return not (self == other)
+
+
+
 class Bundle(object):
     """
     An OSC Bundle element.
@@ -169,15 +734,55 @@ class Bundle(object):
         """
         Encodes the L{Bundle} to binary form, ready to send over the wire.
 
+        Nested elements are written in place into a single preallocated
+        buffer, so the cost is linear in the size of the bundle.
+
         @return: A string with the binary presentation of this L{Bundle}.
         """
-        data = StringArgument("#bundle").toBinary()
-        data += TimeTagArgument(self.timeTag).toBinary()
-        for msg in self.elements:
-            binary = msg.toBinary()
-            data += IntArgument(len(binary)).toBinary()
-            data += binary
-        return data
+        buf = bytearray(self.getBinarySize())
+        self._packInto(buf, 0)
+        return str(buf)
+
+
+    def getBinarySize(self):
+        """
+        Returns the size of the binary form of this L{Bundle}, without encoding it.
+
+        @rtype: C{int}
+        """
+        size = 8 + self._getTimeTagArgument().getBinarySize()
+        for element in self.elements:
+            size += 4 + element.getBinarySize()
+        return size
+
+
+    def _packInto(self, buf, offset):
+        """
+        Writes the binary form of this L{Bundle} into C{buf}.
+
+        The size prefix of each element is written once the element
+        itself has been packed, so that sizes are never computed twice.
+
+        @param buf: A C{bytearray} large enough to hold the bundle.
+        @param offset: Position in C{buf} where to start writing.
+        @return: The position right after the written data.
+        """
+        offset = _packStringInto(buf, offset, "#bundle")
+        offset = self._getTimeTagArgument()._packInto(buf, offset)
+        for element in self.elements:
+            start = offset + 4
+            offset = element._packInto(buf, start)
+            struct.pack_into(">i", buf, start - 4, offset - start)
+        return offset
+
+
+    def _getTimeTagArgument(self):
+        """
+        Returns the time tag of this bundle as a L{TimeTagArgument}.
+        """
+        if isinstance(self.timeTag, TimeTagArgument):
+            return self.timeTag
+        return TimeTagArgument(self.timeTag)
 
 
     def add(self, element):
@@ -189,8 +794,17 @@ class Bundle(object):
         self.elements.append(element)
 
 
+    def freeze(self):
+        """
+        Returns an immutable copy of this bundle, see L{FrozenBundle}.
+
+        @rtype: L{FrozenBundle}
+        """
+        return FrozenBundle(self.elements, self.timeTag)
+
+
     def __eq__(self, other):
-        if not isinstance(other, type(self)):
+        if not isinstance(other, Bundle):
             return False
         if len(self.elements) != len(other.elements):
             return False
@@ -215,35 +829,163 @@ class Bundle(object):
         @return: Two-item tuple with L{Bundle} as the first item, and the
         leftover binary data, as a L{str}. That leftover should be an empty string.
         """
-        bundleStart, data = _stringFromBinary(data)
-        if bundleStart != "#bundle":
-            raise OscError("Error parsing bundle string")
-        bundle = Bundle()
-        bundle.timeTag, data = TimeTagArgument.fromBinary(data)
-        while data:
-            size, data = IntArgument.fromBinary(data)
-            size = size.value
-            if len(data) < size:
-                raise OscError("Unexpected end of bundle: need %d bytes of data" % size)
-            payload = data[:size]
-            bundle.elements.append(_elementFromBinary(payload))
-            data = data[size:]
-        return bundle, ""
+        bundle, offset = Bundle._fromBuffer(data, 0, len(data))
+        return bundle, data[offset:]
 
 
-    def getMessages(self):
+    @staticmethod
+    def _fromBuffer(data, offset, end, lazy=False, arrays=False, limits=None, depth=1):
         """
-        Retrieve all L{Message} elements from this bundle, recursively.
+        Parses a L{Bundle} from C{data}, between C{offset} and C{end}.
+
+        Each element is parsed in place, bounded by its size prefix, so
+        that the remaining data is never copied.
+
+        @param lazy: Whether to create L{LazyMessage} elements.
+        @param arrays: See L{Message.fromBinary}.
+        @param limits: The L{DecodeLimits} to enforce, if any.
+        @param depth: The nesting depth of this bundle.
+
+        @return: Two-item tuple with L{Bundle} as the first item, and the
+        position right after the parsed bundle as the second.
+        """
+        if limits is not None:
+            limits._checkDepth(depth)
+        timeTag, offset = _bundleHeaderFromBuffer(data, offset, end)
+        bundle = Bundle(timeTag=TimeTagArgument(timeTag))
+        while offset < end:
+            offset, stop = _bundleElementFromBuffer(data, offset, end)
+            bundle.elements.append(_elementFromBuffer(data, offset, stop, lazy, arrays, limits, depth))
+            offset = stop
+        return bundle, offset
+
+
+    def getMessages(self):
+        """
+        Retrieve all L{Message} elements from this bundle, recursively.
+
+        See L{iterMessages} to get them in order.
+
+        @return: L{set} of L{Message} instances.
+        """
+        return set([m for timeTag, m in self.iterMessages()])
+
+
+    def iterMessages(self, timeTag=True):
+        """
+        Iterates over all the L{Message} elements from this bundle, in
+        order, depth-first.
+
+        Each message comes with the time tag of its bundle. A nested
+        bundle whose time tag means "immediately" inherits the time tag
+        of its parent.
+
+        @param timeTag: The time tag of the parent bundle.
+        @return: An iterator of two-item tuples, with the time tag value
+        as the first item and a L{Message} as the second.
+        """
+        ownTimeTag = self._getTimeTagArgument().value
+        if ownTimeTag is not True:
+            timeTag = ownTimeTag
+        for element in self.elements:
+            if isinstance(element, Bundle):
+                for item in element.iterMessages(timeTag):
+                    yield item
+            else:
+                yield timeTag, element
+
+
+class _FrozenElement(object):
+    """
+    Base class for the immutable OSC elements.
+
+    The binary form is encoded on the first call to L{toBinary} and
+    kept, so that sending the same element many times only encodes it
+    once. Equality and hashing are computed from that binary form.
+    """
+    _binary = None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % (type(self).__name__))
+
+
+    def add(self, element):
+        raise TypeError("%s is immutable" % (type(self).__name__))
+
+
+    def freeze(self):
+        return self
+
+
+    def toBinary(self):
+        """
+        Returns the memoized binary form of this element.
+
+        @rtype: C{str}
+        """
+        if self._binary is None:
+            buf = bytearray(super(_FrozenElement, self).getBinarySize())
+            super(_FrozenElement, self)._packInto(buf, 0)
+            object.__setattr__(self, "_binary", str(buf))
+        return self._binary
+
+
+    def getBinarySize(self):
+        return len(self.toBinary())
+
+
+    def _packInto(self, buf, offset):
+        binary = self.toBinary()
+        end = offset + len(binary)
+        buf[offset:end] = binary
+        return end
+
+
+    def __eq__(self, other):
+        if isinstance(other, _FrozenElement):
+            return self.toBinary() == other.toBinary()
+        return super(_FrozenElement, self).__eq__(other)
+
+
+    def __hash__(self):
+        return hash(self.toBinary())
+
+
+
+class FrozenMessage(_FrozenElement, Message):
+    """
+    An immutable L{Message}, whose binary form is encoded only once.
+
+    Its arguments are stored in a C{tuple}, and frozen messages can be
+    put in sets or used as dictionary keys. The L{Argument} instances
+    must not be modified once they are part of a frozen message.
+    """
+
+    def __init__(self, address, *args):
+        arguments = []
+        for arg in args:
+            if not isinstance(arg, Argument):
+                arg = createArgument(arg)
+            arguments.append(arg)
+        object.__setattr__(self, "address", address)
+        object.__setattr__(self, "arguments", tuple(arguments))
+
+
+
+class FrozenBundle(_FrozenElement, Bundle):
+    """
+    An immutable L{Bundle}, whose binary form is encoded only once.
+
+    Its elements are frozen as well, and stored in a C{tuple}. Unlike
+    for L{Bundle}, the time tag is taken into account when comparing
+    two frozen bundles.
+    """
+
+    def __init__(self, elements=None, timeTag=True):
+        elements = tuple([element.freeze() for element in elements or ()])
+        object.__setattr__(self, "elements", elements)
+        object.__setattr__(self, "timeTag", timeTag)
 
-        @return: L{set} of L{Message} instances.
-        """
-        r = set()
-        for m in self.elements:
-            if isinstance(m, Bundle):
-                r = r.union(m.getMessages())
-            else:
-                r.add(m)
-        return r
 
 
 class Argument(object):
@@ -254,10 +996,31 @@ class Argument(object):
         of this argument. Every subclass must define its own typeTag.
     """
     typeTag = None
+    _trusted = False
 
     def __init__(self, value):
         self.value = value
-        self._check_type()
+        if not self._trusted:
+            self._check_type()
+
+
+    @classmethod
+    def fromTrustedValue(cls, value):
+        """
+        Creates an argument without checking its value.
+
+        This is meant for values which are known to be valid, such as
+        the ones decoded from binary data. The range of the value is not
+        checked either when the argument is encoded. See also
+        L{setTrustedMode}.
+
+        @param value: The value of the argument.
+        """
+        arg = cls.__new__(cls)
+        arg._trusted = True
+        arg.__init__(value)
+        return arg
+
     
     def _check_type(self):
         """
@@ -270,9 +1033,41 @@ class Argument(object):
         """
         Encodes the L{Argument} to binary form, ready to send over the wire.
 
+        By default, the value is encoded as registered for the type tag
+        of the argument, see L{registerTypeTag}.
+
         @return: A string with the binary presentation of this L{Message}.
         """
-        raise NotImplementedError('Override this method')
+        if self.typeTag not in _tags:
+            raise NotImplementedError('Override this method')
+        return getTypeTagCodec(self.typeTag).pack((self.value,))
+
+
+    def getBinarySize(self):
+        """
+        Returns the size of the binary form of this L{Argument}.
+
+        Subclasses should override it to avoid encoding the argument.
+
+        @rtype: C{int}
+        """
+        return len(self.toBinary())
+
+
+    def _packInto(self, buf, offset):
+        """
+        Writes the binary form of this L{Argument} into C{buf}.
+
+        Subclasses should override it to write directly into the buffer.
+
+        @param buf: A C{bytearray}.
+        @param offset: Position in C{buf} where to start writing.
+        @return: The position right after the written data.
+        """
+        binary = self.toBinary()
+        end = offset + len(binary)
+        buf[offset:end] = binary
+        return end
 
 
     @staticmethod
@@ -315,21 +1110,27 @@ class BlobArgument(Argument):
         return struct.pack(">i%ds" % (length), sz, str(self.value))
 
 
+    def getBinarySize(self):
+        return 4 + _ceilToMultipleOfFour(len(self.value))
+
+
+    def _packInto(self, buf, offset):
+        return _packBlobInto(buf, offset, self.value)
+
+
     @staticmethod
     def fromBinary(data):
         """
         See L{Argument.fromBinary}.
         """
-        try:
-            length = struct.unpack(">i", data[0:4])[0]
-            index_of_leftover = _ceilToMultipleOfFour(length) + 4
-            if len(data)+4 < length:
-                raise OscError("Not enough bytes to find size of a blob of size %s in %s." % (length, data))
-            blob_data = data[4:length + 4]
-        except struct.error:
-            raise OscError("Not enough bytes to find size of a blob argument in %s." % (data))
-        leftover = data[index_of_leftover:]
-        return BlobArgument(blob_data), leftover
+        arg, offset = BlobArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
+
+
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        value, offset = _blobFromBuffer(data, offset, end)
+        return BlobArgument(value), offset
 
 
 
@@ -345,6 +1146,14 @@ class StringArgument(Argument):
         return struct.pack(">%ds" % (length), str(self.value))
 
 
+    def getBinarySize(self):
+        return _ceilToMultipleOfFour(len(self.value))
+
+
+    def _packInto(self, buf, offset):
+        return _packStringInto(buf, offset, self.value)
+
+
     @staticmethod
     def fromBinary(data):
         """
@@ -364,6 +1173,12 @@ class StringArgument(Argument):
         return StringArgument(value), leftover
 
 
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        value, offset = _stringFromBuffer(data, offset, end)
+        return StringArgument(value), offset
+
+
 
 class IntArgument(Argument):
     """
@@ -375,23 +1190,38 @@ class IntArgument(Argument):
         if type(self.value) not in [int, long]:
             raise TypeError("Value %s must be an integer or a long, not a %s." % (self.value, type(self.value).__name__))
 
-    def toBinary(self):
+    def _check_range(self):
         if self.value >= 1<<31:
             raise OverflowError("Integer too large: %d" % self.value)
         if self.value < -1<<31:
             raise OverflowError("Integer too small: %d" % self.value)
+
+    def toBinary(self):
+        if not self._trusted:
+            self._check_range()
         return struct.pack(">i", int(self.value))
 
+    def getBinarySize(self):
+        return 4
+
+    def _packInto(self, buf, offset):
+        if not self._trusted:
+            self._check_range()
+        struct.pack_into(">i", buf, offset, int(self.value))
+        return offset + 4
+
 
     @staticmethod
     def fromBinary(data):
-        try:
-            i = struct.unpack(">i", data[:4])[0]
-            leftover = data[4:]
-        except struct.error:
-            raise OscError("Too few bytes left to get an int from %s." % (data))
+        arg, offset = IntArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
+
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        if offset + 4 > end:
+            raise OscError("Too few bytes left to get an int from %s." % (data[offset:end]))
             #FIXME: do not raise error and return leftover anyways ?
-        return IntArgument(i), leftover
+        return IntArgument(_int32.unpack_from(data, offset)[0]), offset + 4
 
     def __int__(self):
         return int(self.value)
@@ -410,15 +1240,24 @@ class FloatArgument(Argument):
     def toBinary(self):
         return struct.pack(">f", float(self.value))
 
+    def getBinarySize(self):
+        return 4
+
+    def _packInto(self, buf, offset):
+        struct.pack_into(">f", buf, offset, float(self.value))
+        return offset + 4
+
     @staticmethod
     def fromBinary(data):
-        try:
-            f = struct.unpack(">f", data[:4])[0]
-            leftover = data[4:]
-        except struct.error:
-            raise OscError("Too few bytes left to get a float from %s." % (data))
+        arg, offset = FloatArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
+
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        if offset + 4 > end:
+            raise OscError("Too few bytes left to get a float from %s." % (data[offset:end]))
             #FIXME: do not raise error and return leftover anyways ?
-        return FloatArgument(f), leftover
+        return FloatArgument(_float32.unpack_from(data, offset)[0]), offset + 4
 
     def __float__(self):
         return float(self.value)
@@ -436,8 +1275,10 @@ class TimeTagArgument(Argument):
     The time tag value consisting of 63 zero bits followed by a one in
     the least signifigant bit is a special case meaning "immediately."
 
-    In the L{TimeTagArgument} class, the timetag value is a float, or
-    'True' when 'Immediately' is meant.
+    In the L{TimeTagArgument} class, the timetag value is a float, the
+    number of seconds since January 1, 1900, or 'True' when 'Immediately'
+    is meant. Use L{timeTagFromTime} and L{timeTagToTime} to convert it
+    from and to the time returned by C{time.time()}.
 
     """
     typeTag = "t"
@@ -447,26 +1288,29 @@ class TimeTagArgument(Argument):
 
 
     def toBinary(self):
-        if self.value is True:
-            return struct.pack('>qq', 0, 1)
-        fr, sec = math.modf(self.value)
-        return struct.pack('>qq', long(sec), long(fr * 1e9))
+        buf = bytearray(8)
+        _packTimeTagInto(buf, 0, self.value)
+        return str(buf)
+
+
+    def getBinarySize(self):
+        return 8
+
+
+    def _packInto(self, buf, offset):
+        return _packTimeTagInto(buf, offset, self.value)
 
 
     @staticmethod
     def fromBinary(data):
-        binary = data[0:16]
-        if len(binary) != 16:
-            raise OscError("Too few bytes left to get a timetag from %s." % (data))
-        leftover = data[16:]
-
-        if binary == '\0\0\0\0\0\0\0\1':
-            # immediately
-            time = True
-        else:
-            high, low = struct.unpack(">qq", data[0:16])
-            time = float(int(high) + low / float(1e9))
-        return TimeTagArgument(time), leftover
+        arg, offset = TimeTagArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
+
+
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        value, offset = _timeTagFromBuffer(data, offset, end)
+        return TimeTagArgument(value), offset
 
 
 
@@ -485,6 +1329,12 @@ class BooleanArgument(Argument):
     def toBinary(self):
         return "" # bool args do not have data, just a type tag
 
+    def getBinarySize(self):
+        return 0
+
+    def _packInto(self, buf, offset):
+        return offset
+
     def __bool__(self):
         return bool(self.value)
 
@@ -505,6 +1355,14 @@ class _DatalessArgument(Argument):
         return ""
 
 
+    def getBinarySize(self):
+        return 0
+
+
+    def _packInto(self, buf, offset):
+        return offset
+
+
 
 class NullArgument(_DatalessArgument):
     """
@@ -523,6 +1381,117 @@ class ImpulseArgument(_DatalessArgument):
     value = True
 
 
+#
+# OSC 1.1 arrays
+#
+
+class TypedArrayArgument(Argument):
+    """
+    A run of 32-bit float or integer arguments, stored in a typed array.
+
+    Its value is an C{array.array} or a NumPy array. It is encoded with a
+    single byteswapped buffer copy, instead of one L{Argument} per
+    element. Its type tag is the one of its elements, repeated, e.g.
+    C{"fff"} for three floats.
+
+    @ivar elementTypeTag: Either C{"f"} or C{"i"}.
+    """
+
+    def __init__(self, value, elementTypeTag=None):
+        """
+        @param value: An C{array.array} or a NumPy array.
+        @param elementTypeTag: Either C{"f"} or C{"i"}. Guessed from the
+        type of the array if not given.
+        """
+        if elementTypeTag is None:
+            elementTypeTag = _guessArrayTypeTag(value)
+        self.elementTypeTag = elementTypeTag
+        Argument.__init__(self, value)
+
+    def _check_type(self):
+        if not _isTypedArray(self.value):
+            raise TypeError("Value %s must be an array.array or a NumPy array, not a %s." % (self.value, type(self.value).__name__))
+        if self.elementTypeTag not in _arrayTypeCodes:
+            raise TypeError("Typed arrays must contain floats or integers, not %s." % (self.elementTypeTag))
+        if getattr(self.value, "ndim", 1) != 1:
+            raise TypeError("Typed arrays must be one-dimensional, not of shape %s." % (self.value.shape,))
+
+    @property
+    def typeTag(self):
+        return self.elementTypeTag * len(self.value)
+
+    def toBinary(self):
+        buf = bytearray(self.getBinarySize())
+        self._packInto(buf, 0)
+        return str(buf)
+
+    def getBinarySize(self):
+        return 4 * len(self.value)
+
+    def _packInto(self, buf, offset):
+        return _packTypedArrayInto(buf, offset, self.elementTypeTag, self.value)
+
+
+
+class ArrayArgument(Argument):
+    """
+    An OSC 1.1 array, whose elements are enclosed between the C{[} and
+    C{]} type tags.
+
+    Its value is either a C{list} of values, or a typed numeric array
+    (C{array.array} or NumPy array), which is encoded with a single
+    buffer copy.
+
+    @ivar elements: The L{Argument} instances in this array.
+    """
+
+    def __init__(self, value=None, typeTags=None):
+        """
+        @param value: A C{list} of values or L{Argument} instances, or a
+        typed numeric array.
+        @param typeTags: The type tags of the elements, between the
+        brackets. Guessed from the values if not given.
+        """
+        if value is None:
+            value = []
+        if _isTypedArray(value):
+            tag = None
+            if typeTags:
+                tag = typeTags[0]
+            self.elements = [TypedArrayArgument(value, tag)]
+        elif typeTags is not None:
+            self.elements = getTypeTagCodec(typeTags).createArguments(value)
+        else:
+            self.elements = []
+            for element in value:
+                if not isinstance(element, Argument):
+                    element = createArgument(element)
+                self.elements.append(element)
+            value = [element.value for element in self.elements]
+        Argument.__init__(self, value)
+
+    def _check_type(self):
+        if type(self.value) not in [list, tuple] and not _isTypedArray(self.value):
+            raise TypeError("Value %s must be a list or a typed array, not a %s." % (self.value, type(self.value).__name__))
+
+    @property
+    def typeTag(self):
+        return "[" + "".join([element.typeTag for element in self.elements]) + "]"
+
+    def toBinary(self):
+        buf = bytearray(self.getBinarySize())
+        self._packInto(buf, 0)
+        return str(buf)
+
+    def getBinarySize(self):
+        return sum([element.getBinarySize() for element in self.elements])
+
+    def _packInto(self, buf, offset):
+        for element in self.elements:
+            offset = element._packInto(buf, offset)
+        return offset
+
+
 #
 # Optional arguments
 #
@@ -560,20 +1529,31 @@ class _FourByteArgument(Argument):
         return struct.pack(">4B", *self.value)
 
 
+    def getBinarySize(self):
+        return 4
+
+
+    def _packInto(self, buf, offset):
+        struct.pack_into(">4B", buf, offset, *self.value)
+        return offset + 4
+
+
     @staticmethod
     def fromBinary(data):
         """
         See L{Argument.fromBinary}.
         """
-        binary = data[0:4]
-        if len(binary) != 4:
-            raise OscError("Too few bytes left to get four from %s." % (data))
-        leftover = data[4:]
-        try:
-            values = struct.unpack(">4B", binary)
-        except struct.error:
-            raise OscError("Error trying to find four bytes of data in %s." % (binary))
-        return _FourByteArgument(values), leftover
+        arg, offset = _FourByteArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
+
+
+    @classmethod
+    def _fromBuffer(cls, data, offset, end):
+        """
+        Parses four bytes from C{data}, creating an instance of C{cls}.
+        """
+        value, offset = _fourBytesFromBuffer(data, offset, end)
+        return cls(value), offset
 
 
 
@@ -588,8 +1568,8 @@ class ColorArgument(_FourByteArgument):
 
     @staticmethod
     def fromBinary(data):
-        tmp, leftover = _FourByteArgument.fromBinary(data)
-        return ColorArgument(tmp.value), leftover
+        arg, offset = ColorArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
 
 
 class MidiArgument(_FourByteArgument):
@@ -602,113 +1582,1460 @@ class MidiArgument(_FourByteArgument):
 
     @staticmethod
     def fromBinary(data):
-        tmp, leftover = _FourByteArgument.fromBinary(data)
-        return MidiArgument(tmp.value), leftover
+        arg, offset = MidiArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
 
-#class SymbolArgument(StringArgument):
-#    typeTag = "S"
 
 
-#global dicts
-_types = {
-    float: FloatArgument,
-    str: StringArgument,
-    int: IntArgument,
-    bool: BooleanArgument,
-    type(None): NullArgument,
-    }
+class SymbolArgument(StringArgument):
+    """
+    An L{Argument} representing a symbol, encoded as an OSC-string.
+    """
+    typeTag = "S"
 
-_tags = {
-    "b": BlobArgument,
-    "f": FloatArgument,
-    "i": IntArgument,
-    "s": StringArgument,
-    "t": TimeTagArgument,
-    }
+    @staticmethod
+    def fromBinary(data):
+        arg, offset = SymbolArgument._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
 
 
-def createArgument(value, type_tag=None):
+    @staticmethod
+    def _fromBuffer(data, offset, end):
+        value, offset = _stringFromBuffer(data, offset, end)
+        return SymbolArgument(value), offset
+
+
+
+class _StructArgument(Argument):
     """
-    Creates an OSC argument, trying to guess its type if no type is given.
+    Abstract L{Argument} class for fixed-width values encoded with a
+    single C{struct} format.
 
-    Factory of *Attribute objects.
-    @param value: Any Python base type.
-    @param type_tag: One-letter string. One of C{"sifbTFNI"}.
-    @type type_tag: One-letter string.
-    @return: Returns an instance of one of the subclasses of the L{Argument} class.
-    @rtype: L{Argument} subclass.
+    @cvar _struct: The C{struct.Struct} of the value.
     """
-    global _types
-    global _tags
-    kind = type(value)
+    _struct = None
 
-    if type_tag:
-        # Get the argument type based on given type tag
-        if type_tag == "T":
-            return BooleanArgument(True)
-        if type_tag == "F":
-            return BooleanArgument(False)
-        if type_tag == "N":
-            return NullArgument()
-        if type_tag == "I":
-            return ImpulseArgument()
+    def toBinary(self):
+        return self._pack(self._struct.pack, self.value)
 
-        if type_tag in _tags.keys():
-            return _tags[type_tag](value)
 
-        raise OscError("Unknown type tag: %s" % type)
+    def getBinarySize(self):
+        return self._struct.size
 
-    else:
-        # Guess the argument type based on the type of the value
-        if kind in _types.keys():
-            return _types[kind](value)
 
-        raise OscError("No OSC argument type for %s (value = %s)" % (kind, value))
+    def _packInto(self, buf, offset):
+        self._pack(self._struct.pack_into, buf, offset, self.value)
+        return offset + self._struct.size
 
 
-#
-# private functions
-#
+    def _pack(self, pack, *args):
+        try:
+            return pack(*args)
+        except struct.error, e:
+            raise OscError("Cannot pack %s as %s: %s" % (self.value, self.typeTag, e))
 
-def _ceilToMultipleOfFour(num):
-    """
-    Rounds a number to the closest higher number that is a mulitple of four.
-    That is for data that need to be padded with zeros so that the length of their data
-    must be a multiple of 32 bits.
-    """
-    return num + (4 - (num % 4))
 
+    @classmethod
+    def fromBinary(cls, data):
+        arg, offset = cls._fromBuffer(data, 0, len(data))
+        return arg, data[offset:]
 
-def _argumentFromBinary(type_tag, data):
-    if type_tag == "T":
-        return BooleanArgument(True), data
-    if type_tag == "F":
-        return BooleanArgument(False), data
-    if type_tag == "N":
-        return NullArgument(), data
-    if type_tag == "I":
-        return ImpulseArgument(), data
 
-    global _tags
-    if type_tag not in _tags:
-        raise OscError("Invalid typetag: %s" % type_tag)
+    @classmethod
+    def _fromBuffer(cls, data, offset, end):
+        size = cls._struct.size
+        if offset + size > end:
+            raise OscError("Too few bytes left to get a %s argument from %s." % (cls.typeTag, data[offset:end]))
+        return cls(cls._struct.unpack_from(data, offset)[0]), offset + size
 
-    return _tags[type_tag].fromBinary(data)
 
 
-def _stringFromBinary(data):
-    null_pos = string.find(data, "\0") # find the first null char
-    value = data[0:null_pos] # get the first string out of data
-    # find the position of the beginning of the next data
-    leftover = data[_ceilToMultipleOfFour(null_pos):]
-    return value, leftover
+class Int64Argument(_StructArgument):
+    """
+    An L{Argument} representing a 64-bit signed integer.
+    """
+    typeTag = "h"
+    _struct = struct.Struct(">q")
+
+    def _check_type(self):
+        if type(self.value) not in [int, long]:
+            raise TypeError("Value %s must be an integer or a long, not a %s." % (self.value, type(self.value).__name__))
+
+    def __int__(self):
+        return int(self.value)
 
 
-def _elementFromBinary(data):
-    if data[0] == "/":
-        element, data = Message.fromBinary(data)
-    elif data[0] == "#":
-        element, data = Bundle.fromBinary(data)
-    else:
-        raise OscError("Error parsing OSC data: " + data)
-    return element
+
+class DoubleArgument(_StructArgument):
+    """
+    An L{Argument} representing a 64-bit floating-point value.
+    """
+    typeTag = "d"
+    _struct = struct.Struct(">d")
+
+    def _check_type(self):
+        if type(self.value) not in [float, int, long]:
+            raise TypeError("Value %s must be a float, an int or a long, not a %s." % (self.value, type(self.value).__name__))
+
+    def __float__(self):
+        return float(self.value)
+
+
+
+class CharArgument(_StructArgument):
+    """
+    An L{Argument} representing an ASCII character, sent as 32 bits.
+    """
+    typeTag = "c"
+    _struct = struct.Struct(">3xc")
+
+    def _check_type(self):
+        if type(self.value) is not str or len(self.value) != 1:
+            raise TypeError("Value %s must be a string of one character." % (self.value,))
+
+
+# precompiled structs used by the decoders
+_timeTag = struct.Struct(">II")
+_int32 = struct.Struct(">i")
+_float32 = struct.Struct(">f")
+_fourBytes = struct.Struct(">4B")
+
+# struct formats of the fixed-width type tags. The other type tags
+# are decoded and encoded by the functions of _variableHandlers.
+_fixedFormats = {
+    "c": "3xc",
+    "d": "d",
+    "f": "f",
+    "h": "q",
+    "i": "i",
+    }
+
+# values of the type tags which have no data
+_datalessValues = {
+    "T": True,
+    "F": False,
+    "N": None,
+    "I": True,
+    }
+
+# kinds of steps of a TypeTagCodec
+_FIXED, _VARIABLE, _TYPED, _ARRAY = range(4)
+
+# array.array type codes of the type tags which can be decoded as typed arrays
+_arrayTypeCodes = {
+    "f": "f",
+    "i": array.array("i").itemsize == 4 and "i" or "l",
+    }
+
+# NumPy types of the type tags which can be decoded as typed arrays
+_numpyTypes = {
+    "f": ">f4",
+    "i": ">i4",
+    }
+
+# duration of the unit of the fraction of a time tag, 2 ** -32 seconds
+_FRACTION = 1.0 / 4294967296
+
+# whether typed arrays need to be byteswapped to big-endian
+_byteswap = sys.byteorder == "little"
+
+#global dicts
+_types = {
+    float: FloatArgument,
+    str: StringArgument,
+    int: IntArgument,
+    bool: BooleanArgument,
+    type(None): NullArgument,
+    list: ArrayArgument,
+    array.array: TypedArrayArgument,
+    }
+if numpy is not None:
+    _types[numpy.ndarray] = TypedArrayArgument
+
+_tags = {
+    "b": BlobArgument,
+    "c": CharArgument,
+    "d": DoubleArgument,
+    "f": FloatArgument,
+    "h": Int64Argument,
+    "i": IntArgument,
+    "m": MidiArgument,
+    "r": ColorArgument,
+    "s": StringArgument,
+    "S": SymbolArgument,
+    "t": TimeTagArgument,
+    }
+
+
+def setTrustedMode(trusted):
+    """
+    Enables or disables the checks of the argument values, globally.
+
+    When the trusted mode is enabled, the type of the values is not
+    checked when arguments are created, and their range is not checked
+    when they are encoded. Invalid values may then be encoded wrongly,
+    or raise C{struct.error}. See also L{Argument.fromTrustedValue}.
+
+    @type trusted: C{bool}
+    """
+    Argument._trusted = bool(trusted)
+
+
+# seconds from January 1, 1900, the NTP epoch, to January 1, 1970
+_NTP_DELTA = 2208988800
+
+
+def timeTagFromTime(seconds):
+    """
+    Converts a time as returned by C{time.time()} to a time tag value.
+
+    @param seconds: Seconds since January 1, 1970, as a C{float}.
+    @return: Seconds since January 1, 1900, as a C{float}.
+    """
+    return seconds + _NTP_DELTA
+
+
+def timeTagToTime(timeTag):
+    """
+    Converts a time tag value to a time as returned by C{time.time()}.
+
+    @param timeTag: Seconds since January 1, 1900, as a C{float}.
+    @return: Seconds since January 1, 1970, as a C{float}.
+    """
+    return timeTag - _NTP_DELTA
+
+
+def ntpFromTime(seconds):
+    """
+    Converts a time as returned by C{time.time()} to a 64-bit NTP timestamp.
+
+    The whole seconds and the fraction are converted separately, so that
+    no precision is lost in float rounding.
+
+    @param seconds: Seconds since January 1, 1970, as a C{float}.
+    @return: The timestamp as an C{int}, whose higher 32 bits are the
+    seconds since January 1, 1900, and lower 32 bits the fraction.
+    """
+    whole = int(seconds)
+    return ((whole + _NTP_DELTA) << 32) | int((seconds - whole) * 4294967296.0)
+
+
+def timeFromNtp(timestamp):
+    """
+    Converts a 64-bit NTP timestamp to a time as returned by C{time.time()}.
+
+    @param timestamp: The timestamp as an C{int}, see L{ntpFromTime}.
+    @return: Seconds since January 1, 1970, as a C{float}.
+    """
+    return ((timestamp >> 32) - _NTP_DELTA) + (timestamp & 0xFFFFFFFF) * _FRACTION
+
+
+def createArgument(value, type_tag=None):
+    """
+    Creates an OSC argument, trying to guess its type if no type is given.
+
+    Factory of *Attribute objects.
+    @param value: Any Python base type.
+    @param type_tag: One-letter string. One of C{"TFNI"} or of the
+    registered type tags, see L{registerTypeTag}.
+    @type type_tag: One-letter string.
+    @return: Returns an instance of one of the subclasses of the L{Argument} class.
+    @rtype: L{Argument} subclass.
+    """
+    global _types
+    global _tags
+    kind = type(value)
+
+    if type_tag:
+        # Get the argument type based on given type tag
+        if type_tag == "T":
+            return BooleanArgument(True)
+        if type_tag == "F":
+            return BooleanArgument(False)
+        if type_tag == "N":
+            return NullArgument()
+        if type_tag == "I":
+            return ImpulseArgument()
+
+        if type_tag in _tags.keys():
+            return _tags[type_tag](value)
+
+        raise OscError("Unknown type tag: %s" % type_tag)
+
+    else:
+        # Guess the argument type based on the type of the value
+        if kind in _types.keys():
+            return _types[kind](value)
+
+        raise OscError("No OSC argument type for %s (value = %s)" % (kind, value))
+
+
+class TypeTagCodec(object):
+    """
+    Decoder and encoder compiled for a given type tag string.
+
+    Every run of consecutive fixed-width arguments is covered by a
+    single precompiled C{struct.Struct}, so that it is decoded or
+    encoded with a single call. Strings, blobs, time tags and the other
+    variable-width type tags are handled in between by their registered
+    functions, see L{registerTypeTag}, and OSC 1.1 arrays, enclosed
+    between C{[} and C{]}, by a nested codec. Use L{getTypeTagCodec} to
+    get cached instances.
+
+    The values handled by a codec are laid out as the type tags: one
+    value per type tag, and a C{list} per array. When C{arrays} is
+    true, runs of several C{f} or C{i} arguments, and arrays which only
+    contain such arguments, are decoded as a single typed C{array.array}
+    instead, and decoded as L{TypedArrayArgument} instances.
+
+    @ivar typeTags: The type tags, without the leading comma.
+    @type typeTags: C{str}
+    @ivar arrays: Whether numeric runs are decoded as typed arrays.
+    @ivar fixedStruct: The C{struct.Struct} covering all the arguments,
+        if they all have a fixed width, or C{None}.
+    """
+
+    def __init__(self, typeTags, arrays=False):
+        """
+        @raise OscError: If a type tag is unknown or if the array type
+        tags are not balanced.
+        """
+        self.typeTags = typeTags
+        self.arrays = arrays
+        self._steps = []
+        self._factories = []
+        fmt = ""
+        tags = ""
+        indices = []
+        start = 0
+        for item, count in _groupTypeTags(typeTags, arrays):
+            index = len(self._factories)
+            if count is None and item in _fixedFormats:
+                fmt += _fixedFormats[item]
+                tags += item
+                indices.append(index)
+                self._factories.append(_argumentClassForTag(item))
+            elif count is None and item in _datalessValues:
+                tags += item
+                self._factories.append(_argumentClassForTag(item))
+            else:
+                self._addFixedStep(fmt, tags, indices, start, index)
+                if count is not None:
+                    self._steps.append((_TYPED, item, count, index))
+                    self._factories.append(_typedArrayFactory(item))
+                elif item.startswith("["):
+                    inner = item[1:-1]
+                    typed = None
+                    if inner and inner == inner[0] * len(inner) and inner[0] in _arrayTypeCodes:
+                        typed = inner[0]
+                    self._steps.append((_ARRAY, TypeTagCodec(inner, arrays), typed, index))
+                    self._factories.append(_arrayFactory(inner))
+                else:
+                    factory = _argumentClassForTag(item)
+                    self._steps.append((_VARIABLE, _variableHandlers[item], None, index))
+                    self._factories.append(factory)
+                fmt = ""
+                tags = ""
+                indices = []
+                start = index + 1
+        self._addFixedStep(fmt, tags, indices, start, len(self._factories))
+        self._trustedFactories = [getattr(factory, "fromTrustedValue", factory) for factory in self._factories]
+        self.fixedStruct = None
+        if len(self._steps) == 1 and self._steps[0][0] == _FIXED and self._steps[0][3] is None:
+            self.fixedStruct = self._steps[0][1]
+
+
+    def _addFixedStep(self, fmt, tags, indices, start, stop):
+        """
+        Adds a step for the fixed-width and dataless arguments from
+        C{start} to C{stop}.
+
+        @param tags: The type tags of these arguments. Arrays and typed
+        runs take a single value for several type tags, so C{start} and
+        C{stop}, which are positions in the values, cannot be used to
+        slice the type tags.
+        """
+        if start == stop:
+            return
+        if len(indices) == stop - start:
+            # no dataless argument in between
+            indices = None
+        else:
+            indices = tuple(indices)
+        self._steps.append((_FIXED, struct.Struct(">" + fmt), (start, stop, tags), indices))
+
+
+    def decodeValues(self, data, offset, end, limits=None):
+        """
+        Parses the values of the arguments at C{offset} in C{data}.
+
+        @param limits: The L{DecodeLimits} whose blob budget to enforce, if any.
+        @return: Two-item tuple with the C{list} of values and the
+        position right after the arguments.
+        """
+        values = []
+        for kind, compiled, extra, indices in self._steps:
+            if kind == _FIXED:
+                if offset + compiled.size > end:
+                    raise OscError("Too few bytes left to get arguments %s from %s." % (self.typeTags, data[offset:end]))
+                unpacked = compiled.unpack_from(data, offset)
+                offset += compiled.size
+                if indices is None:
+                    values.extend(unpacked)
+                else:
+                    unpacked = iter(unpacked)
+                    for tag in extra[2]:
+                        if tag in _datalessValues:
+                            values.append(_datalessValues[tag])
+                        else:
+                            values.append(unpacked.next())
+            elif kind == _VARIABLE:
+                if limits is not None and compiled[0] is _blobFromBuffer:
+                    limits._checkBlob(data, offset, end)
+                value, offset = compiled[0](data, offset, end)
+                values.append(value)
+            elif kind == _TYPED:
+                value, offset = _typedArrayFromBuffer(compiled, extra, data, offset, end)
+                values.append(value)
+            elif self.arrays and extra:
+                value, offset = _typedArrayFromBuffer(extra, len(compiled.typeTags), data, offset, end)
+                values.append(value)
+            else:
+                value, offset = compiled.decodeValues(data, offset, end, limits)
+                values.append(value)
+        return values, offset
+
+
+    def checkBlobs(self, data, offset, end, limits):
+        """
+        Checks the blobs of the arguments at C{offset} in C{data} against
+        the blob budget of C{limits}, without decoding any value.
+
+        The fixed-width arguments and the typed runs are skipped by their
+        known sizes, and only the length prefixes of the blobs and the
+        terminators of the strings are read.
+
+        @return: The position right after the arguments.
+        """
+        for kind, compiled, extra, indices in self._steps:
+            if kind == _FIXED:
+                offset += compiled.size
+            elif kind == _TYPED:
+                offset += 4 * extra
+            elif kind == _ARRAY:
+                offset = compiled.checkBlobs(data, offset, end, limits)
+            elif compiled[0] is _blobFromBuffer:
+                offset = limits._checkBlob(data, offset, end)
+            else:
+                offset = _skipValueFromBuffer(compiled[0], data, offset, end)
+        return offset
+
+
+    def decodeArguments(self, data, offset, end, limits=None):
+        """
+        Parses the arguments at C{offset} in C{data}.
+
+        @param limits: See L{decodeValues}.
+        @return: Two-item tuple with the C{list} of L{Argument} instances
+        and the position right after the arguments.
+        """
+        values, offset = self.decodeValues(data, offset, end, limits)
+        return self.createArguments(values, True), offset
+
+
+    def createArguments(self, values, trusted=False):
+        """
+        Creates the L{Argument} instances for the given values.
+
+        @param trusted: Whether to skip the checks of the values, see
+        L{Argument.fromTrustedValue}.
+        @rtype: C{list}
+        """
+        if trusted:
+            factories = self._trustedFactories
+        else:
+            factories = self._factories
+        return [factory(value) for factory, value in zip(factories, values)]
+
+
+    def getBinarySize(self, values):
+        """
+        Returns the size of the binary form of the given argument values.
+        """
+        size = 0
+        for kind, compiled, extra, index in self._steps:
+            if kind == _FIXED:
+                size += compiled.size
+            elif kind == _VARIABLE:
+                size += compiled[1](values[index])
+            elif kind == _TYPED:
+                size += 4 * extra
+            else:
+                size += compiled.getBinarySize(values[index])
+        return size
+
+
+    def packInto(self, buf, offset, values):
+        """
+        Writes the binary form of the given argument values into C{buf}.
+
+        @param values: A sequence with one value per type tag, and a
+        sequence per array. Values of dataless arguments are ignored.
+        @return: The position right after the written data.
+        """
+        if len(values) != len(self._factories):
+            raise OscError("Expected %d values for type tags %s, got %d." % (len(self._factories), self.typeTags, len(values)))
+        for kind, compiled, extra, index in self._steps:
+            if kind == _FIXED:
+                if index is None:
+                    packed = values[extra[0]:extra[1]]
+                else:
+                    packed = [values[i] for i in index]
+                try:
+                    compiled.pack_into(buf, offset, *packed)
+                except struct.error, e:
+                    raise OscError("Cannot pack %s as %s: %s" % (packed, self.typeTags, e))
+                offset += compiled.size
+            elif kind == _VARIABLE:
+                offset = compiled[2](buf, offset, values[index])
+            elif kind == _TYPED:
+                offset = _packTypedArrayInto(buf, offset, compiled, values[index])
+            elif extra and _isTypedArray(values[index]):
+                if len(values[index]) != len(compiled.typeTags):
+                    raise OscError("Expected %d values for type tags %s, got %d." % (len(compiled.typeTags), compiled.typeTags, len(values[index])))
+                offset = _packTypedArrayInto(buf, offset, extra, values[index])
+            else:
+                offset = compiled.packInto(buf, offset, values[index])
+        return offset
+
+
+    def pack(self, values):
+        """
+        Returns the binary form of the given argument values.
+        """
+        buf = bytearray(self.getBinarySize(values))
+        self.packInto(buf, 0, values)
+        return str(buf)
+
+
+
+class MessageTemplate(object):
+    """
+    Pre-encoded address and type tags, for sending many messages with
+    the same address and the same argument types.
+
+    The address and type tag strings are encoded once. When all the
+    arguments have a fixed width, the whole message is encoded with a
+    single C{struct} call. The encoded messages can be given to the
+    C{send} method of the senders instead of a L{Message}::
+
+        gain = MessageTemplate("/mixer/ch/3/gain", "f")
+        protocol.send(gain.encode(0.5), ("127.0.0.1", 17779))
+
+    @ivar address: The OSC address string.
+    @ivar typeTags: The type tags, without the leading comma.
+    @ivar trusted: Whether the values given to L{toMessage} are not checked.
+    """
+
+    def __init__(self, address, typeTags, trusted=False):
+        """
+        @param address: The OSC address string, e.g. C{"/foo/bar"}.
+        @param typeTags: The type tags, e.g. C{"ifs"}. A leading comma is optional.
+        @param trusted: Whether to skip the checks of the values when
+        creating messages, see L{Argument.fromTrustedValue}.
+        @raise OscError: If a type tag is unknown.
+        """
+        if typeTags.startswith(","):
+            typeTags = typeTags[1:]
+        self.address = address
+        self.typeTags = typeTags
+        self.trusted = trusted
+        self._codec = getTypeTagCodec(typeTags)
+        header = bytearray(_getHeaderSize(address, typeTags))
+        _packHeaderInto(header, 0, address, typeTags)
+        self._header = str(header)
+        self._struct = None
+        if self._codec.fixedStruct is not None:
+            # only fixed-width arguments: encode the header with them
+            self._struct = struct.Struct(">%ds%s" % (len(header), self._codec.fixedStruct.format[1:]))
+
+
+    def encode(self, *values):
+        """
+        Encodes a message with the given argument values.
+
+        @param values: One value per type tag. Values of dataless
+        arguments such as C{T} or C{N} are ignored.
+        @return: A C{str} with the binary presentation of the message.
+        """
+        if self._struct is not None:
+            try:
+                return self._struct.pack(self._header, *values)
+            except struct.error, e:
+                raise OscError("Cannot pack %s as %s: %s" % (values, self.typeTags, e))
+        return self._header + self._codec.pack(values)
+
+
+    def toMessage(self, *values):
+        """
+        Creates a L{Message} with the given argument values.
+
+        @rtype: L{Message}
+        """
+        return Message(self.address, *self._codec.createArguments(values, self.trusted))
+
+
+
+class BundlePacker(object):
+    """
+    Packs a stream of elements into bundles which fit in a datagram.
+
+    Each element is written once, at its exact size, into a buffer of
+    C{maxSize} bytes. When the next element does not fit, the bundle
+    is sent and a new one is started. Call L{flush} to send the last
+    bundle, e.g. at the end of each frame::
+
+        packer = BundlePacker(lambda packet: protocol.send(packet, ("127.0.0.1", 17779)))
+        for address, value in parameters:
+            packer.add(Message(address, value))
+        packer.flush()
+
+    An element which does not fit in C{maxSize} bytes, even alone, is
+    sent in a bundle of its own.
+
+    @ivar send: Callable called with each encoded bundle, as a C{str}.
+    @ivar maxSize: The maximum size of a bundle, in bytes. The default
+    is the largest UDP payload which fits in an Ethernet frame.
+    @ivar timeTag: The time tag of the bundles, written when they are sent.
+    @ivar packets: The number of bundles sent.
+    """
+
+    def __init__(self, send, maxSize=1472, timeTag=True):
+        """
+        @raise ValueError: If C{maxSize} cannot even fit an empty message.
+        """
+        if maxSize < 28:
+            raise ValueError("Bundles of %d bytes are too small." % (maxSize))
+        self.send = send
+        self.maxSize = maxSize
+        self.timeTag = timeTag
+        self.packets = 0
+        self._buffer = bytearray(maxSize)
+        _packStringInto(self._buffer, 0, "#bundle")
+        self._offset = 16
+
+
+    def add(self, element):
+        """
+        Adds an element to the current bundle, sending the bundle first
+        if the element does not fit in it.
+
+        @param element: A L{Message} or a L{Bundle}, or an already
+        encoded C{str}, such as returned by L{MessageTemplate.encode}.
+        """
+        if isinstance(element, str):
+            size = len(element)
+        else:
+            size = element.getBinarySize()
+        if self._offset + 4 + size > self.maxSize:
+            self.flush()
+            if 20 + size > self.maxSize:
+                buf = bytearray(20 + size)
+                _packStringInto(buf, 0, "#bundle")
+                self._sendBundle(buf, _packElementInto(buf, 16, element, size))
+                return
+        self._offset = _packElementInto(self._buffer, self._offset, element, size)
+
+
+    def flush(self):
+        """
+        Sends the current bundle, if it contains any element.
+        """
+        if self._offset > 16:
+            end = self._offset
+            self._offset = 16
+            try:
+                self._sendBundle(self._buffer, end)
+            finally:
+                # the packing functions expect the padding to be zeroed
+                self._buffer[16:end] = bytearray(end - 16)
+
+
+    def _sendBundle(self, buf, end):
+        timeTag = self.timeTag
+        if isinstance(timeTag, TimeTagArgument):
+            timeTag = timeTag.value
+        _packTimeTagInto(buf, 8, timeTag)
+        self.packets += 1
+        self.send(str(buf[:end]))
+
+
+
+codecCache = LRUCache(maxSize=256)
+
+
+def getTypeTagCodec(typeTags, arrays=False):
+    """
+    Returns the L{TypeTagCodec} for the given type tags.
+
+    Codecs are kept in the bounded L{codecCache}, whose counters tell
+    how often a type tag string is seen again.
+
+    @param typeTags: The type tags, without the leading comma.
+    @type typeTags: C{str}
+    @param arrays: Whether numeric runs are decoded as typed arrays.
+    @rtype: L{TypeTagCodec}
+    @raise OscError: If a type tag is unknown.
+    """
+    key = typeTags
+    if arrays:
+        key = (typeTags, True)
+    codec = codecCache.get(key)
+    if codec is None:
+        codec = TypeTagCodec(typeTags, arrays)
+        codecCache.set(key, codec)
+    return codec
+
+
+def registerTypeTag(typeTag, argumentClass, structFormat=None, decoder=None, getSize=None, encoder=None):
+    """
+    Registers an argument type, so that it can be decoded and encoded.
+
+    A type tag either has a fixed width, given as the C{struct} format
+    of a single value, e.g. C{"q"}, or a variable width, handled by
+    three functions:
+     - C{decoder(data, offset, end)} returns the value at C{offset} in
+       C{data}, and the position right after it;
+     - C{getSize(value)} returns the size of the encoded value;
+     - C{encoder(buf, offset, value)} writes the value into the
+       C{bytearray} C{buf}, and returns the position right after it.
+
+    An already registered type tag is replaced.
+
+    @param typeTag: A 1-character C{str}.
+    @param argumentClass: The L{Argument} subclass to create for the
+        decoded values, whose C{typeTag} is C{typeTag}.
+    @raise ValueError: If the type tag is reserved, or if the handlers
+        are not consistent.
+    """
+    if len(typeTag) != 1 or typeTag in ",[]TFNI":
+        raise ValueError("Cannot register type tag %r." % (typeTag,))
+    if structFormat is not None:
+        if decoder or getSize or encoder:
+            raise ValueError("Type tag %s cannot have both a struct format and functions." % (typeTag))
+        if struct.calcsize(">" + structFormat) % 4:
+            raise ValueError("The size of type tag %s must be a multiple of 4 bytes." % (typeTag))
+        _variableHandlers.pop(typeTag, None)
+        _fixedFormats[typeTag] = structFormat
+    else:
+        if not (decoder and getSize and encoder):
+            raise ValueError("Type tag %s needs a struct format or three functions." % (typeTag))
+        _fixedFormats.pop(typeTag, None)
+        _variableHandlers[typeTag] = (decoder, getSize, encoder)
+    _tags[typeTag] = argumentClass
+    codecCache.clear()
+
+
+#
+# private functions
+#
+
+def _ceilToMultipleOfFour(num):
+    """
+    Rounds a number to the closest higher number that is a mulitple of four.
+    That is for data that need to be padded with zeros so that the length of their data
+    must be a multiple of 32 bits.
+    """
+    return num + (4 - (num % 4))
+
+
+def _packStringInto(buf, offset, value):
+    """
+    Writes a null-terminated, zero-padded OSC string into a preallocated buffer.
+
+    The buffer is expected to be filled with zeros already, so only the
+    characters of the string are copied.
+
+    @param buf: A C{bytearray}.
+    @param offset: Position in C{buf} where to start writing.
+    @param value: The C{str} to write.
+    @return: The position right after the padded string.
+    """
+    value = str(value)
+    length = len(value)
+    buf[offset:offset + length] = value
+    return offset + _ceilToMultipleOfFour(length)
+
+
+def _argumentClassForTag(type_tag):
+    """
+    Returns the L{Argument} subclass to create for the given type tag.
+    """
+    if type_tag in "TF":
+        return BooleanArgument
+    if type_tag == "N":
+        return NullArgument
+    if type_tag == "I":
+        return ImpulseArgument
+    if type_tag not in _tags:
+        raise OscError("Invalid typetag: %s" % type_tag)
+    return _tags[type_tag]
+
+
+def _groupTypeTags(typeTags, arrays):
+    """
+    Splits type tags into the items compiled by a L{TypeTagCodec}.
+
+    @param arrays: Whether to group runs of C{f} or C{i} type tags.
+    @return: A C{list} of two-item tuples. The first item is a type tag,
+    or the type tags of an array, including its brackets. The second
+    item is the number of elements of a run, or C{None}.
+    @raise OscError: If the array type tags are not balanced.
+    """
+    items = []
+    i = 0
+    length = len(typeTags)
+    while i < length:
+        tag = typeTags[i]
+        j = i + 1
+        if tag == "[":
+            depth = 1
+            while j < length and depth:
+                if typeTags[j] == "[":
+                    depth += 1
+                elif typeTags[j] == "]":
+                    depth -= 1
+                j += 1
+            if depth:
+                raise OscError("Unbalanced array type tags: %s" % typeTags)
+            items.append((typeTags[i:j], None))
+        elif tag == "]":
+            raise OscError("Unbalanced array type tags: %s" % typeTags)
+        elif arrays and tag in _arrayTypeCodes:
+            while j < length and typeTags[j] == tag:
+                j += 1
+            if j - i > 1:
+                items.append((tag, j - i))
+            else:
+                items.append((tag, None))
+        else:
+            items.append((tag, None))
+        i = j
+    return items
+
+
+def _typedArrayFactory(tag):
+    return lambda value: TypedArrayArgument(value, tag)
+
+
+def _arrayFactory(typeTags):
+    return lambda value: ArrayArgument(value, typeTags)
+
+
+def _isTypedArray(value):
+    """
+    Returns whether the value is an C{array.array} or a NumPy array.
+    """
+    if isinstance(value, array.array):
+        return True
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _guessArrayTypeTag(value):
+    """
+    Returns the type tag of the elements of a typed numeric array.
+    """
+    if isinstance(value, array.array):
+        kind = value.typecode
+        if kind in "fd":
+            kind = "f"
+        elif kind in "bBhHiIlL":
+            kind = "i"
+    elif numpy is not None and isinstance(value, numpy.ndarray):
+        kind = value.dtype.kind
+    else:
+        raise TypeError("Value %s must be an array.array or a NumPy array, not a %s." % (value, type(value).__name__))
+    if kind == "f":
+        return "f"
+    if kind in "iub":
+        return "i"
+    raise TypeError("Typed arrays must contain floats or integers, not %s." % (value))
+
+
+def _packTypedArrayInto(buf, offset, tag, value):
+    """
+    Writes a typed numeric array as big-endian 32-bit values into C{buf}.
+
+    @param tag: Either C{"f"} or C{"i"}.
+    @return: The position right after the written data.
+    @raise OscError: If the array is not one-dimensional, or if its
+    values do not fit in 32-bit integers.
+    """
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        if value.ndim != 1:
+            raise OscError("Typed arrays must be one-dimensional, not of shape %s." % (value.shape,))
+        dtype = value.dtype
+        if tag == "i" and dtype.kind in "iu" and (dtype.itemsize > 4 or dtype.kind == "u" and dtype.itemsize == 4):
+            if len(value) and (value.max() > 0x7fffffff or value.min() < -0x80000000):
+                raise OscError("Values of %s do not fit in 32-bit integers." % (value,))
+        converted = value.astype(_numpyTypes[tag])
+    elif isinstance(value, array.array) and value.typecode == _arrayTypeCodes[tag]:
+        converted = value[:]
+        if _byteswap:
+            converted.byteswap()
+    else:
+        try:
+            converted = array.array(_arrayTypeCodes[tag], value)
+        except OverflowError:
+            raise OscError("Values of %s do not fit in 32-bit integers." % (value,))
+        if _byteswap:
+            converted.byteswap()
+    end = offset + 4 * len(value)
+    buf[offset:end] = buffer(converted)
+    return end
+
+
+def _typedArrayFromBuffer(tag, count, data, offset, end):
+    """
+    Parses C{count} big-endian 32-bit values at C{offset} in C{data}.
+
+    @param tag: Either C{"f"} or C{"i"}.
+    @return: Two-item tuple with an C{array.array} and the position of
+    the beginning of the next data.
+    """
+    size = 4 * count
+    if offset + size > end:
+        raise OscError("Too few bytes left to get %d arguments %s from %s." % (count, tag, data[offset:end]))
+    values = array.array(_arrayTypeCodes[tag])
+    values.fromstring(buffer(data, offset, size))
+    if _byteswap:
+        values.byteswap()
+    return values, offset + size
+
+
+def _getHeaderSize(address, typeTags):
+    """
+    Returns the size of the address and type tag strings of a message.
+
+    @param typeTags: The type tags, without the leading comma.
+    """
+    return _ceilToMultipleOfFour(len(address)) + _ceilToMultipleOfFour(len(typeTags) + 1)
+
+
+def _packHeaderInto(buf, offset, address, typeTags):
+    """
+    Writes the address and type tag strings of a message into C{buf}.
+
+    @param typeTags: The type tags, without the leading comma.
+    @return: The position right after the type tag string.
+    """
+    offset = _packStringInto(buf, offset, address)
+    return _packStringInto(buf, offset, "," + typeTags)
+
+
+def _packBlobInto(buf, offset, value):
+    value = str(value)
+    _int32.pack_into(buf, offset, len(value))
+    return _packStringInto(buf, offset + 4, value)
+
+
+def _packTimeTagInto(buf, offset, value):
+    if value is True:
+        # immediately
+        _timeTag.pack_into(buf, offset, 0, 1)
+    else:
+        whole = int(value)
+        try:
+            _timeTag.pack_into(buf, offset, whole, int((value - whole) * 4294967296.0))
+        except struct.error, e:
+            raise OscError("Cannot pack %s as a timetag: %s" % (value, e))
+    return offset + 8
+
+
+def _packElementInto(buf, offset, element, size):
+    """
+    Writes the size prefix and the binary form of a bundle element.
+
+    @param element: A L{Message} or a L{Bundle}, or a C{str}.
+    @param size: The size of the binary form of the element.
+    @return: The position right after the written data.
+    """
+    _int32.pack_into(buf, offset, size)
+    offset += 4
+    if isinstance(element, str):
+        buf[offset:offset + size] = element
+        return offset + size
+    return element._packInto(buf, offset)
+
+
+def _argumentFromBinary(type_tag, data):
+    arg, offset = _argumentFromBuffer(type_tag, data, 0, len(data))
+    return arg, data[offset:]
+
+
+def _argumentFromBuffer(type_tag, data, offset, end):
+    """
+    Parses the argument of the given type tag at C{offset} in C{data}.
+
+    @return: Two-item tuple with the L{Argument} and the position right after it.
+    """
+    if len(type_tag) != 1:
+        raise OscError("Invalid typetag: %s" % type_tag)
+    arguments, offset = getTypeTagCodec(type_tag).decodeArguments(data, offset, end)
+    return arguments[0], offset
+
+
+def _blobFromBuffer(data, offset, end):
+    """
+    Parses the value of a blob at C{offset} in C{data}.
+
+    @return: Two-item tuple with the C{str} value and the position of
+    the beginning of the next data.
+    """
+    if offset + 4 > end:
+        raise OscError("Not enough bytes to find size of a blob argument in %s." % (data[offset:end]))
+    length = _int32.unpack_from(data, offset)[0]
+    start = offset + 4
+    if length < 0 or start + length > end:
+        raise OscError("Not enough bytes to find size of a blob of size %s in %s." % (length, data[offset:end]))
+    return data[start:start + length], start + _ceilToMultipleOfFour(length)
+
+
+def _skipValueFromBuffer(decode, data, offset, end):
+    """
+    Finds the end of the variable-width value at C{offset} in C{data},
+    other than a blob, without slicing strings out of it.
+
+    @param decode: The function which decodes the value.
+    @return: The position of the beginning of the next data.
+    """
+    if decode is _stringFromBuffer:
+        null_pos = data.find("\0", offset, end)
+        if null_pos == -1:
+            raise OscError("Missing null terminator in OSC string: %s" % (data[offset:end]))
+        return offset + _ceilToMultipleOfFour(null_pos - offset)
+    return decode(data, offset, end)[1]
+
+
+def _fourBytesFromBuffer(data, offset, end):
+    """
+    Parses the four bytes of a color or MIDI argument at C{offset} in C{data}.
+
+    @return: Two-item tuple with a C{tuple} of four C{int} and the
+    position of the beginning of the next data.
+    """
+    if offset + 4 > end:
+        raise OscError("Too few bytes left to get four from %s." % (data[offset:end]))
+    return _fourBytes.unpack_from(data, offset), offset + 4
+
+
+def _packFourBytesInto(buf, offset, value):
+    try:
+        _fourBytes.pack_into(buf, offset, *value)
+    except (struct.error, TypeError), e:
+        raise OscError("Cannot pack %s as four bytes: %s" % (value, e))
+    return offset + 4
+
+
+def _timeTagFromBuffer(data, offset, end):
+    """
+    Parses the value of a time tag at C{offset} in C{data}.
+
+    @return: Two-item tuple with the value and the position of the
+    beginning of the next data.
+    """
+    if offset + 8 > end:
+        raise OscError("Too few bytes left to get a timetag from %s." % (data[offset:end]))
+
+    seconds, fraction = _timeTag.unpack_from(data, offset)
+    if seconds == 0 and fraction == 1:
+        # immediately
+        return True, offset + 8
+    return seconds + fraction * _FRACTION, offset + 8
+
+
+def _stringFromBinary(data):
+    value, offset = _stringFromBuffer(data, 0, len(data))
+    return value, data[offset:]
+
+
+def _stringFromBuffer(data, offset, end):
+    """
+    Parses a null-terminated OSC string at C{offset} in C{data}.
+
+    @return: Two-item tuple with the C{str} value and the position of
+    the beginning of the next data.
+    """
+    null_pos = data.find("\0", offset, end) # find the first null char
+    if null_pos == -1:
+        raise OscError("Missing null terminator in OSC string: %s" % (data[offset:end]))
+    # find the position of the beginning of the next data
+    return data[offset:null_pos], offset + _ceilToMultipleOfFour(null_pos - offset)
+
+
+def iterMessagesFromBinary(data, lazy=False, arrays=False, limits=None):
+    """
+    Iterates over the messages of a packet, decoding them one at a time.
+
+    Unlike L{Bundle.fromBinary}, this does not build the tree of nested
+    bundles. Messages are decoded in wire order, depth-first, only when
+    the iterator reaches them, so that they can be handled before the
+    rest of a large bundle is parsed.
+
+    @param data: A C{str} with a L{Message} or a L{Bundle}.
+    @param lazy: Whether messages should be L{LazyMessage} instances.
+    @param arrays: See L{Message.fromBinary}.
+    @param limits: The L{DecodeLimits} to enforce, if any.
+    @return: An iterator of two-item tuples, with the time tag value as
+    the first item and a L{Message} as the second. See
+    L{Bundle.iterMessages}. A message which is not in a bundle comes
+    with C{True}, meaning "immediately".
+    @raise DecodeLimitError: If the packet exceeds C{limits}, while iterating.
+    """
+    if lazy:
+        parse = lambda data, offset, end: LazyMessage._fromBuffer(data, offset, end, arrays, limits)[0]
+    else:
+        parse = lambda data, offset, end: Message._fromBuffer(data, offset, end, arrays, limits)[0]
+    if limits is not None:
+        limits.checkPacketSize(len(data))
+    return _iterMessagesFromBuffer(data, 0, len(data), True, parse, limits)
+
+
+def _iterMessagesFromBuffer(data, offset, end, timeTag, parse, limits=None, depth=0):
+    """
+    Iterates over the messages found between C{offset} and C{end} in C{data}.
+
+    @param timeTag: The time tag of the enclosing bundle.
+    @param parse: A function called with C{data} and the bounds of each
+    message, whose result is yielded with the time tag of the message.
+    @param limits: The L{DecodeLimits} whose depth limit to enforce, if any.
+    @param depth: The nesting depth of the enclosing bundle.
+    """
+    kind = data[offset:offset + 1]
+    if kind == "/":
+        yield timeTag, parse(data, offset, end)
+    elif kind == "#":
+        depth += 1
+        if limits is not None:
+            limits._checkDepth(depth)
+        bundleTimeTag, offset = _bundleHeaderFromBuffer(data, offset, end)
+        if bundleTimeTag is not True:
+            timeTag = bundleTimeTag
+        while offset < end:
+            offset, stop = _bundleElementFromBuffer(data, offset, end)
+            for item in _iterMessagesFromBuffer(data, offset, stop, timeTag, parse, limits, depth):
+                yield item
+            offset = stop
+    else:
+        raise OscError("Error parsing OSC data: " + data[offset:end])
+
+
+def decodeMany(buffers, columnar=False, lazy=False, arrays=False, limits=None):
+    """
+    Decodes many packets at once, such as the datagrams received during
+    a reactor iteration.
+
+    The packets are parsed in a single loop, sharing the cached type tag
+    codecs.
+
+    @param buffers: An iterable of C{str}, each with a binary L{Message}
+    or L{Bundle}.
+    @param columnar: Whether to return the values of the messages
+    grouped by type tags, instead of L{Message} and L{Bundle} objects.
+    @param lazy: Whether messages should be L{LazyMessage} instances.
+    Ignored if C{columnar} is true.
+    @param arrays: See L{Message.fromBinary}.
+    @param limits: The L{DecodeLimits} to enforce on each packet, if any.
+    @return: If C{columnar} is false, a C{list} with one L{Message} or
+    L{Bundle} per packet. Otherwise, a C{dict} whose keys are the type
+    tags, without the leading comma, and whose values are
+    L{MessageColumns} instances, for all the messages of the packets,
+    including those in bundles.
+    @raise OscError: If a packet is invalid.
+    """
+    if not columnar:
+        return [_elementFromBinary(data, lazy, arrays, limits) for data in buffers]
+    columns = {}
+    for data in buffers:
+        if limits is not None:
+            limits.checkPacketSize(len(data))
+        for timeTag, header in _iterMessagesFromBuffer(data, 0, len(data), True, _messageBoundsFromBuffer, limits):
+            address, typeTags, offset, end = header
+            if limits is not None:
+                limits._checkArguments(typeTags)
+            group = columns.get(typeTags)
+            if group is None:
+                group = columns[typeTags] = MessageColumns(typeTags, arrays)
+            group._append(timeTag, address, data, offset, end, limits)
+    return columns
+
+
+
+class MessageColumns(object):
+    """
+    The messages of a batch decoded by L{decodeMany} which share the
+    same type tags, stored by column instead of as L{Message} objects.
+
+    When all the arguments are floats, or all are integers, the values
+    are stored in a single flat C{array.array}.
+
+    @ivar typeTags: The type tags, without the leading comma.
+    @ivar width: The number of values of each message.
+    @ivar addresses: A C{list} with the address of each message.
+    @ivar timeTags: A C{list} with the time tag of each message. See
+        L{iterMessagesFromBinary}.
+    @ivar values: The values of all the messages, one message after the
+        other, in a flat C{list} or C{array.array}.
+    """
+    __slots__ = ("typeTags", "width", "addresses", "timeTags", "values", "_codec", "_typed")
+
+    def __init__(self, typeTags, arrays=False):
+        self.typeTags = typeTags
+        self._codec = getTypeTagCodec(typeTags, arrays)
+        self.width = len(self._codec._factories)
+        self.addresses = []
+        self.timeTags = []
+        self._typed = None
+        if typeTags and typeTags == typeTags[0] * len(typeTags) and typeTags[0] in _arrayTypeCodes:
+            self._typed = typeTags[0]
+            self.width = len(typeTags)
+            self.values = array.array(_arrayTypeCodes[self._typed])
+        else:
+            self.values = []
+
+
+    def _append(self, timeTag, address, data, offset, end, limits=None):
+        """
+        Decodes the arguments of a message, adding them to the columns.
+        """
+        if self._typed is None:
+            values = self._codec.decodeValues(data, offset, end, limits)[0]
+        else:
+            values = _typedArrayFromBuffer(self._typed, self.width, data, offset, end)[0]
+        self.values.extend(values)
+        self.addresses.append(address)
+        self.timeTags.append(timeTag)
+
+
+    def getColumn(self, index):
+        """
+        Returns the values of the given argument for every message.
+        """
+        return self.values[index::self.width]
+
+
+    def getRow(self, index):
+        """
+        Returns the values of the arguments of the given message.
+        """
+        return self.values[index * self.width:(index + 1) * self.width]
+
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+#
+# SLIP framing, for OSC 1.1 over streams
+#
+
+_SLIP_END = "\xc0"
+_SLIP_ESC = "\xdb"
+_SLIP_ESC_END = "\xdb\xdc"
+_SLIP_ESC_ESC = "\xdb\xdd"
+
+
+def slipEncode(data):
+    """
+    Encodes a packet as a SLIP frame (RFC 1055), as recommended by OSC
+    1.1 for stream-based transports.
+
+    The frame begins and ends with an C{END} byte, so that the receiver
+    can resynchronize after corrupted bytes.
+
+    @param data: A C{str} with a binary L{Message} or L{Bundle}.
+    @rtype: C{str}
+    """
+    data = data.replace(_SLIP_ESC, _SLIP_ESC_ESC).replace(_SLIP_END, _SLIP_ESC_END)
+    return _SLIP_END + data + _SLIP_END
+
+
+
+class SlipDecoder(object):
+    """
+    Incremental decoder of a stream of SLIP frames.
+
+    Each chunk of data is split on the C{END} bytes, and each frame is
+    joined and unescaped once it is complete, with string methods
+    instead of a loop over the bytes. Empty frames are ignored.
+
+    @ivar limits: The L{DecodeLimits} whose packet size limit to
+        enforce, or C{None}. The bytes of a frame which exceeds it are
+        discarded until its end, instead of being buffered.
+    @ivar errors: The number of frames dropped because of an invalid
+        escape sequence.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = limits
+        self.errors = 0
+        self._chunks = []
+        self._size = 0
+        self._dropping = False
+
+
+    def feed(self, data):
+        """
+        Decodes a chunk of the stream.
+
+        @param data: A C{str} of any length.
+        @return: A C{list} with the packets whose frame ended in C{data}.
+        """
+        packets = []
+        parts = data.split(_SLIP_END)
+        self._append(parts[0])
+        for part in parts[1:]:
+            self._endFrame(packets)
+            self._append(part)
+        return packets
+
+
+    def _append(self, chunk):
+        if not chunk or self._dropping:
+            return
+        self._size += len(chunk)
+        if self.limits is not None and self._size > self.limits.maxPacketSize:
+            self.limits.violations["maxPacketSize"] += 1
+            self._chunks = []
+            self._dropping = True
+        else:
+            self._chunks.append(chunk)
+
+
+    def _endFrame(self, packets):
+        if self._chunks:
+            frame = "".join(self._chunks)
+            escapes = frame.count(_SLIP_ESC)
+            if escapes == 0:
+                packets.append(frame)
+            elif escapes == frame.count(_SLIP_ESC_END) + frame.count(_SLIP_ESC_ESC):
+                packets.append(frame.replace(_SLIP_ESC_END, _SLIP_END).replace(_SLIP_ESC_ESC, _SLIP_ESC))
+            else:
+                self.errors += 1
+        self._chunks = []
+        self._size = 0
+        self._dropping = False
+
+
+def _messageHeaderFromBuffer(data, offset, end):
+    """
+    Parses the address and the type tags of a message.
+
+    @return: Three-item tuple with the address, the type tags without
+    the leading comma, and the position of the first argument.
+    """
+    osc_address, offset = _stringFromBuffer(data, offset, end)
+    osc_address = getAddressPath(osc_address)[0]
+    type_tags, offset = _stringFromBuffer(data, offset, end)
+
+    if not type_tags.startswith(","):
+        # invalid type tag string
+        raise OscError("Invalid typetag string: %s" % type_tags)
+    return osc_address, type_tags[1:], offset
+
+
+def _messageBoundsFromBuffer(data, offset, end):
+    """
+    Parses the header of a message, returning its address, its type tags
+    and the bounds of its arguments.
+    """
+    return _messageHeaderFromBuffer(data, offset, end) + (end,)
+
+
+def _bundleHeaderFromBuffer(data, offset, end):
+    """
+    Parses the C{#bundle} string and the time tag of a bundle.
+
+    @return: Two-item tuple with the time tag value and the position of
+    the first element.
+    """
+    bundleStart, offset = _stringFromBuffer(data, offset, end)
+    if bundleStart != "#bundle":
+        raise OscError("Error parsing bundle string")
+    return _timeTagFromBuffer(data, offset, end)
+
+
+def _bundleElementFromBuffer(data, offset, end):
+    """
+    Parses the size of the bundle element at C{offset} in C{data}.
+
+    @return: Two-item tuple with the positions of the beginning and of
+    the end of the element.
+    """
+    if offset + 4 > end:
+        raise OscError("Too few bytes left to get the size of a bundle element.")
+    size = _int32.unpack_from(data, offset)[0]
+    offset += 4
+    if size < 0 or offset + size > end:
+        raise OscError("Unexpected end of bundle: need %d bytes of data" % size)
+    return offset, offset + size
+
+
+def elementToBinary(element):
+    """
+    Returns the binary form of an element, ready to be sent.
+
+    @param element: A L{Message} or a L{Bundle}, or an already encoded
+    C{str}, such as returned by L{MessageTemplate.encode}, which is
+    returned as is.
+    @rtype: C{str}
+    """
+    if isinstance(element, str):
+        return element
+    return element.toBinary()
+
+
+def _elementFromBinary(data, lazy=False, arrays=False, limits=None):
+    """
+    Parses a L{Message} or a L{Bundle}.
+
+    @param lazy: Whether messages should be L{LazyMessage} instances,
+    whose arguments are only decoded when accessed.
+    @param arrays: Whether runs of float or integer arguments should be
+    decoded as L{TypedArrayArgument} instances.
+    @param limits: The L{DecodeLimits} to enforce, if any.
+    """
+    if limits is not None:
+        limits.checkPacketSize(len(data))
+    return _elementFromBuffer(data, 0, len(data), lazy, arrays, limits)
+
+
+def _elementFromBuffer(data, offset, end, lazy=False, arrays=False, limits=None, depth=0):
+    """
+    Parses the L{Message} or L{Bundle} found between C{offset} and C{end} in C{data}.
+
+    @param depth: The nesting depth of the enclosing bundle.
+    """
+    kind = data[offset:offset + 1]
+    if kind == "/":
+        if lazy:
+            element, offset = LazyMessage._fromBuffer(data, offset, end, arrays, limits)
+        else:
+            element, offset = Message._fromBuffer(data, offset, end, arrays, limits)
+    elif kind == "#":
+        element, offset = Bundle._fromBuffer(data, offset, end, lazy, arrays, limits, depth + 1)
+    else:
+        raise OscError("Error parsing OSC data: " + data[offset:end])
+    return element
+
+
+# decoder, size and encoder functions of the type tags which do not
+# have a fixed struct format, see registerTypeTag
+_variableHandlers = {
+    "b": (_blobFromBuffer, lambda value: 4 + _ceilToMultipleOfFour(len(value)), _packBlobInto),
+    "m": (_fourBytesFromBuffer, lambda value: 4, _packFourBytesInto),
+    "r": (_fourBytesFromBuffer, lambda value: 4, _packFourBytesInto),
+    "s": (_stringFromBuffer, lambda value: _ceilToMultipleOfFour(len(value)), _packStringInto),
+    "S": (_stringFromBuffer, lambda value: _ceilToMultipleOfFour(len(value)), _packStringInto),
+    "t": (_timeTagFromBuffer, lambda value: 8, _packTimeTagInto),
+    }
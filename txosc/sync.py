@@ -12,6 +12,7 @@ script.
 """
 import socket
 import struct
+from txosc.osc import elementToBinary, slipEncode
 
 #TODO: receiver
 #TODO: bidirectional sender-receiver
@@ -23,8 +24,10 @@ class _Sender(object):
         self._socket = None
 
     def send(self, element):
-        binary = element.toBinary()
-        self._actually_send(binary)
+        """
+        @param element: See L{txosc.osc.elementToBinary}.
+        """
+        self._actually_send(elementToBinary(element))
 
     def _actually_send(self, binary_data):
         """
@@ -56,6 +59,32 @@ class TcpSender(_Sender):
     def close(self):
         self._socket.close()
 
+class SlipSender(_Sender):
+    """
+    Send OSC 1.1 over a stream, using SLIP framing.
+
+    Connects over TCP, or uses any given stream socket, such as one end
+    of a C{socket.socketpair()}.
+    """
+    def __init__(self, address=None, port=None, sock=None):
+        """
+        @param sock: A connected stream socket, used instead of
+            connecting to C{address} and C{port}.
+        """
+        _Sender.__init__(self)
+        self.address = address
+        self.port = port
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.connect((self.address, self.port))
+        self._socket = sock
+
+    def _actually_send(self, binary_data):
+        self._socket.sendall(slipEncode(binary_data))
+
+    def close(self):
+        self._socket.close()
+
 UDP_MODE_MULTICAST = "multicast"
 UDP_MODE_BROADCAST = "broadcast"
 
@@ -8,10 +8,16 @@ Maintainer: Arjan Scherpenisse
 """
 
 from twisted.trial import unittest
+import array
+import socket
+import struct
+
 from twisted.internet import reactor, defer, task
+from twisted.test import proto_helpers
 from txosc import osc
 from txosc import async
 from txosc import dispatch
+from txosc import sync
 
 
 class ClientServerTests(object):
@@ -33,6 +39,19 @@ class ClientServerTests(object):
         return d
 
 
+    def testTemplate(self):
+        template = osc.MessageTemplate("/gain", "if")
+        d = defer.Deferred()
+
+        def gain(m, addr):
+            self.assertEquals(m, osc.Message("/gain", 3, 0.5))
+            d.callback(True)
+
+        self.receiver.addCallback("/gain", gain)
+        self._send(template.encode(3, 0.5))
+        return d
+
+
     def testBundle(self):
 
         pingMsg = osc.Message("/ping")
@@ -78,6 +97,18 @@ class TestUDPClientServer(unittest.TestCase, ClientServerTests):
     def _send(self, element):
         self.client.send(element, ("127.0.0.1", 17778))
 
+
+class TestLazyUDPClientServer(TestUDPClientServer):
+    """
+    Test the L{osc.Sender} and L{dispatch.Receiver} over UDP via
+    localhost, decoding L{osc.LazyMessage} instances.
+    """
+
+    def setUp(self):
+        TestUDPClientServer.setUp(self)
+        self.serverPort.protocol.lazy = True
+
+
 class TestMulticastClientServer(unittest.TestCase):
     """
     Test the L{osc.Sender} and two L{dispatch.Receiver} over Multicast UDP via 224.0.0.1.
@@ -142,6 +173,112 @@ class TestTCPClientServer(unittest.TestCase, ClientServerTests):
 
 
 
+class TestSLIPClientServer(TestTCPClientServer):
+    """
+    Test the L{async.SlipProtocol} via localhost.
+    """
+
+    def setUp(self):
+        self.receiver = dispatch.Receiver()
+        self.serverPort = reactor.listenTCP(17778, async.SlipServerFactory(self.receiver))
+        self.client = async.SlipClientFactory()
+        self.clientPort = reactor.connectTCP("localhost", 17778, self.client)
+        return self.client.deferred
+
+
+    def testSocketPair(self):
+        received = []
+        self.receiver.addCallback("/foo", lambda m, c: received.append(m))
+        protocol = async.SlipServerFactory(self.receiver).buildProtocol(None)
+        protocol.makeConnection(proto_helpers.StringTransport())
+        ours, theirs = socket.socketpair()
+        sender = sync.SlipSender(sock=theirs)
+        sender.send(osc.Message("/foo", osc.BlobArgument("\xc0\xdb")))
+        sender.send(osc.Message("/foo", 2))
+        sender.close()
+        data = ours.recv(4096)
+        while data:
+            protocol.dataReceived(data)
+            data = ours.recv(4096)
+        ours.close()
+        self.assertEquals([m.getValues() for m in received], [["\xc0\xdb"], [2]])
+
+    def testDecodeErrors(self):
+        received = []
+        self.receiver.addCallback("/foo", lambda m, c: received.append(m))
+        protocol = async.SlipServerFactory(self.receiver).buildProtocol(None)
+        protocol.makeConnection(proto_helpers.StringTransport())
+        protocol.dataReceived(osc.slipEncode("garbage") + osc.slipEncode(osc.Message("/foo").toBinary()))
+        self.assertEquals(len(received), 1)
+        self.assertEquals((protocol.decodeErrors, protocol._decoder.errors), (1, 0))
+
+
+
+class TestDecodeLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.received = []
+        self.receiver = dispatch.Receiver()
+        self.receiver.addCallback("/foo", lambda m, c: self.received.append(m))
+
+    def testStreamFrameSize(self):
+        factory = async.ServerFactory(self.receiver, osc.DecodeLimits(maxPacketSize=64))
+        protocol = factory.buildProtocol(None)
+        transport = proto_helpers.StringTransport()
+        protocol.makeConnection(transport)
+        binary = osc.Message("/foo", 1).toBinary()
+        protocol.dataReceived(struct.pack(">i", len(binary)) + binary)
+        self.assertEquals(len(self.received), 1)
+        # the size prefix is rejected before the payload is buffered
+        protocol.dataReceived(struct.pack(">i", 1 << 30))
+        self.assertTrue(transport.disconnecting)
+        self.assertEquals(factory.limits.getStats()["maxPacketSize"], 1)
+
+    def testDatagramDropped(self):
+        protocol = async.DatagramServerProtocol(self.receiver, osc.DecodeLimits(maxDepth=1))
+        nested = osc.Bundle([osc.Bundle([osc.Message("/foo")])])
+        protocol.datagramReceived(nested.toBinary(), ("127.0.0.1", 17778))
+        protocol.datagramReceived(osc.Bundle([osc.Message("/foo")]).toBinary(), ("127.0.0.1", 17778))
+        self.assertEquals(len(self.received), 1)
+        self.assertEquals(protocol.limits.getStats()["maxDepth"], 1)
+
+    def testPacketRejectedWhole(self):
+        protocol = async.DatagramServerProtocol(self.receiver, osc.DecodeLimits(maxDepth=2))
+        deep = osc.Bundle([osc.Bundle([osc.Message("/foo")])])
+        protocol.datagramReceived(osc.Bundle([osc.Message("/foo"), deep]).toBinary(), ("127.0.0.1", 17778))
+        self.assertEquals(self.received, [])
+        self.assertEquals(protocol.limits.getStats()["maxDepth"], 1)
+
+    def testLazyBlobs(self):
+        limits = osc.DecodeLimits(maxBlobBytes=10)
+        binary = osc.Message("/foo", osc.BlobArgument("x" * 100)).toBinary()
+        self.assertRaises(osc.DecodeLimitError, self.receiver.dispatchBinary, binary, None, True, False, limits)
+        self.assertEquals(self.received, [])
+        self.assertEquals(limits.getStats()["maxBlobBytes"], 1)
+
+    def testBlobsCheckedWhileDecoding(self):
+        # only the size and the depth reject a packet as a whole
+        protocol = async.DatagramServerProtocol(self.receiver, osc.DecodeLimits(maxBlobBytes=10))
+        big = osc.Message("/foo", osc.BlobArgument("x" * 100))
+        packet = osc.Bundle([osc.Message("/foo", 1), big, osc.Message("/foo", 2)])
+        protocol.datagramReceived(packet.toBinary(), ("127.0.0.1", 17778))
+        self.assertEquals([m.getValues() for m in self.received], [[1]])
+        self.assertEquals(protocol.limits.getStats()["maxBlobBytes"], 1)
+
+    def testLargeFrame(self):
+        # the default limits let a frame of 4096 floats through
+        binary = osc.Message("/foo", array.array("f", [0.5] * 4096)).toBinary()
+        for arrays in (False, True):
+            protocol = async.DatagramServerProtocol(self.receiver)
+            protocol.arrays = arrays
+            protocol.datagramReceived(binary, ("127.0.0.1", 17778))
+        self.assertEquals(len(self.received), 2)
+        self.assertEquals(len(self.received[0].arguments), 4096)
+        self.assertEquals(self.received[1].getValues(), [array.array("f", [0.5] * 4096)])
+        self.assertEquals(protocol.limits.getStats()["maxArguments"], 0)
+
+
+
 class TestReceiverWithExternalClient(unittest.TestCase):
     """
     This test needs python-liblo.
@@ -7,6 +7,8 @@ Tests for txosc/dispatch.py
 Maintainer: Arjan Scherpenisse
 """
 
+import re
+
 from twisted.trial import unittest
 from twisted.internet import reactor, defer, task
 from txosc import osc
@@ -217,6 +219,86 @@ class TestAddressNode(unittest.TestCase):
         self.assertFalse(dispatch.AddressNode.matchesWildcard("a!c", "a[!!]c"))
 
 
+    def testCompiledWildcards(self):
+        # the string-based matchers agree with the regular expressions
+        values = [""]
+        for i in range(4):
+            values += [v + c for v in values if len(v) == i for c in "ab"]
+        for wildcard in ["a*", "*b", "a*b", "*ab*", "a*b*a", "**", "a?b", "?", "ab?", "a.b"]:
+            regex = re.compile("^" + wildcard.replace("*", ".*").replace("?", ".?") + "$")
+            matcher = dispatch.AddressNode.compileWildcard(wildcard)
+            for value in values + ["a.b"]:
+                self.assertEquals(bool(matcher(value)), value == wildcard or regex.match(value) is not None, (wildcard, value))
+
+    def testWildcardCache(self):
+        dispatch.wildcardCache.clear()
+        hits = dispatch.wildcardCache.hits
+        matcher = dispatch.AddressNode.compileWildcard("foo*")
+        self.assertIdentical(dispatch.AddressNode.compileWildcard("foo*"), matcher)
+        self.assertEquals(dispatch.wildcardCache.hits, hits + 1)
+        self.assertRaises(osc.OscError, dispatch.AddressNode().addCallback, "/foo[", lambda m, c: None)
+
+    def testWildcardsOverlap(self):
+        overlap = dispatch.AddressNode.wildcardsOverlap
+        for first, second in [("foo*", "*bar"), ("f?o", "fo"), ("*", "[a-c]"),
+                ("[!a]x", "[ab]?"), ("{foo,bar}", "b*"), ("a*b*c", "*bbb*"), ("x?", "x*")]:
+            self.assertTrue(overlap(first, second), (first, second))
+            self.assertTrue(overlap(second, first), (second, first))
+        for first, second in [("foo*", "bar*"), ("*a", "*b"), ("[ab]", "[!ab]"),
+                ("{foo,bar}", "baz?"), ("a?", "abc*d"), ("x[0-9]", "x[a-z]*")]:
+            self.assertFalse(overlap(first, second), (first, second))
+            self.assertFalse(overlap(second, first), (second, first))
+        # groups are not expanded, so many of them are cheap
+        self.assertTrue(overlap("{a,b}x" * 32, "*x"))
+        self.assertFalse(overlap("{a,b}x" * 32, "*y"))
+        self.assertTrue(overlap("{a,{b,c}d}", "cd"))
+        self.assertRaises(osc.OscError, overlap, "{a,b", "a")
+
+    def testMatchAllWildcardNodes(self):
+        n = dispatch.AddressNode()
+        cbs = {}
+        for pattern in ["/fixture/1*/dimmer", "/fixture/*2/dimmer", "/fixture/?2/dimmer",
+                "/fixture/[0-9]*/dimmer", "/fixture/2*/dimmer", "/fixture/*/pan"]:
+            cbs[pattern] = lambda m, c: None
+            n.addCallback(pattern, cbs[pattern])
+        expected = set([cbs[p] for p in ["/fixture/1*/dimmer", "/fixture/*2/dimmer",
+            "/fixture/?2/dimmer", "/fixture/[0-9]*/dimmer"]])
+        self.assertEquals(n.getCallbacks("/fixture/12/dimmer"), expected)
+        self.assertEquals(n.getCallbacks("/fixture/1*/dimmer"), expected)
+        self.assertEquals(n.getCallbacks("/fixture/3*/dimmer"), set([cbs["/fixture/*2/dimmer"],
+            cbs["/fixture/?2/dimmer"], cbs["/fixture/[0-9]*/dimmer"]]))
+        n.removeCallback("/fixture/*2/dimmer", cbs["/fixture/*2/dimmer"])
+        self.assertEquals(n.getCallbacks("/fixture/12/dimmer"), expected - set([cbs["/fixture/*2/dimmer"]]))
+
+    def testMatchAnyDepth(self):
+        recv = dispatch.Receiver()
+        cbs = [lambda m, c, i=i: None for i in range(5)]
+        recv.addCallback("//level", cbs[0])
+        recv.addCallback("/mixer/*/level", cbs[1])
+        recv.addCallback("/mixer//mute", cbs[2])
+        recv.addCallback("/a/b/c/level", cbs[3])
+        recv.addCallback("/", cbs[4])
+        expected = [
+            ("/mixer/1/level", [0, 1]),
+            ("/a/b/c/level", [0, 3]),
+            ("/level", [0]),
+            ("/mixer/mute", [2]),
+            ("/mixer/1/2/mute", [2]),
+            ("/mute", []),
+            ("/", [4]),
+            ("/a/b", []),
+            ("//level", [0, 1, 3]),
+            ("/mixer//mute", [2]),
+            ("//mute", [2]),
+            ("/a//c/level", [0, 3]),
+            ("/a//", []),
+            ]
+        for address, indices in expected:
+            self.assertEquals(recv.getCallbacks(address), set([cbs[i] for i in indices]), address)
+        recv.compile()
+        for address, indices in expected:
+            self.assertEquals(recv.getCallbacks(address), set([cbs[i] for i in indices]), address)
+
     def testWildcardAnyStringsMatching(self):
         self.assertTrue(dispatch.AddressNode.matchesWildcard("foo", "{foo,bar}"))
         self.assertTrue(dispatch.AddressNode.matchesWildcard("bar", "{foo,bar}"))
@@ -300,6 +382,32 @@ class TestAddressNode(unittest.TestCase):
         self.assertEquals(parent.getCallbacks("/foo/bar"), set([]))
         self.assertEquals(parent.getCallbacks("/baz/foo/bar"), set([cb]))
 
+
+    def testCompactNodes(self):
+        first = lambda m, c: None
+        second = lambda m, c: None
+        n = dispatch.AddressNode()
+        self.assertFalse(hasattr(n, "__dict__"))
+        n.addCallback("/foo/bar", second)
+        n.addCallback("/foo/bar", first)
+        n.addCallback("/foo/bar", second)
+        self.assertEquals(n._childNodes["foo"]._childNodes["bar"]._callbacks, (second, first))
+        self.assertRaises(ValueError, n.addCallback, "/foo/b r/baz", first)
+        self.assertEquals(n._childNodes["foo"]._childNodes.keys(), ["bar"])
+        self.assertRaises(KeyError, n.removeCallback, "/foo", first)
+        n.removeCallback("/foo/bar", second)
+        n.removeCallback("/foo/bar", first)
+        self.assertIdentical(n._childNodes, None)
+
+        # renamed wildcard nodes are matched under their new name only
+        child = dispatch.AddressNode()
+        child.addCallback("/baz", first)
+        n.addNode("b*", child)
+        self.assertEquals(n.getCallbacks("/bar/baz"), set([first]))
+        child.setName("f*")
+        self.assertEquals(n.getCallbacks("/bar/baz"), set())
+        self.assertEquals(n.getCallbacks("/foo/baz"), set([first]))
+
     testRemoveCallbacksByPattern.skip = "This feature is not implemented."
 
 
@@ -308,6 +416,106 @@ class TestReceiver(unittest.TestCase):
     Test the L{dispatch.Receiver} class.
     """
 
+    def testCallbackCache(self):
+        recv = dispatch.Receiver()
+        called = []
+        cb = lambda m, c: called.append(1)
+        recv.addCallback("/foo/bar", cb)
+        self.assertEquals(recv.resolveCallbacks("/foo/bar"), (cb,))
+        self.assertEquals(recv.resolveCallbacks("/foo/bar"), (cb,))
+        stats = recv.getCacheStats()
+        self.assertEquals((stats["hits"], stats["misses"]), (1, 1))
+
+        # changes anywhere in the tree discard the cached callbacks
+        other = lambda m, c: None
+        recv.addCallback("/foo/*", other)
+        self.assertEquals(recv.getCallbacks("/foo/bar"), set([cb, other]))
+        recv.removeCallback("/foo/*", other)
+        self.assertEquals(recv.resolveCallbacks("/foo/bar"), (cb,))
+        node = dispatch.AddressNode()
+        node.addCallback("/bar", other)
+        recv.addNode("egg", node)
+        self.assertEquals(recv.resolveCallbacks("/egg/bar"), (other,))
+        node.removeCallback("/bar", other)
+        self.assertEquals(recv.resolveCallbacks("/egg/bar"), ())
+        recv.removeAllCallbacks()
+        self.assertEquals(recv.resolveCallbacks("/foo/bar"), ())
+
+
+
+    def testCompile(self):
+        recv = dispatch.Receiver()
+        cbs = [lambda m, c, i=i: None for i in range(5)]
+        recv.addCallback("/foo/bar", cbs[0])
+        recv.addCallback("/foo/b*", cbs[1])
+        recv.addCallback("/foo/?ar", cbs[2])
+        recv.addCallback("/foo", cbs[3])
+        recv.addCallback("/egg/[hs]*am", cbs[4])
+        addresses = ["/foo/bar", "/foo/baz", "/foo/car", "/foo", "/egg/ham",
+            "/egg/eggs", "/foo/*", "/foo/[a-c]ar", "/egg/*", "/*", "/foo/b*", "/nothing"]
+        expected = [recv.getCallbacks(address) for address in addresses]
+        self.assertEquals(expected[0], set(cbs[:3]))
+
+        table = recv.compile()
+        self.assertIsInstance(table, dispatch.DispatchTable)
+        self.assertEquals([set(table.resolveCallbacks(a)) for a in addresses], expected)
+        self.assertEquals([recv.getCallbacks(a) for a in addresses], expected)
+        self.assertEquals(table.resolveCallbacks("/foo/bar"), recv.resolveCallbacks("/foo/bar"))
+
+        # the tree is compiled again after it changes
+        recv.removeCallback("/foo/b*", cbs[1])
+        self.assertEquals(recv.getCallbacks("/foo/bar"), set([cbs[0], cbs[2]]))
+        self.assertIsNot(recv._table, table)
+        self.assertEquals(set(table.resolveCallbacks("/foo/bar")), set(cbs[:3]))
+
+
+    def testDispatchingByPriority(self):
+        recv = dispatch.Receiver()
+        called = []
+        def callback(name):
+            return lambda message, client: called.append(name)
+        select = callback("select")
+        recv.addCallback("/mixer/*/gain", callback("log"), priority=-1)
+        recv.addCallback("/mixer/1/gain", callback("first"))
+        recv.addCallback("/mixer/*/gain", callback("second"))
+        recv.addCallback("/mixer/1/gain", callback("third"))
+        recv.addCallback("/mixer//gain", select, priority=10)
+        recv.addCallback("/mixer/?/gain", select)
+        expected = ["select", "first", "second", "third", "log"]
+        recv.dispatch(osc.Message("/mixer/1/gain"), None)
+        self.assertEquals(called, expected)
+        del called[:]
+        recv.compile()
+        recv.dispatch(osc.Message("/mixer/1/gain"), None)
+        self.assertEquals(called, expected)
+        del called[:]
+        recv.dispatch(osc.Message("/mixer/2/gain"), None)
+        self.assertEquals(called, ["select", "second", "log"])
+
+
+    def testCompiledDispatchingWhileChanging(self):
+        recv = dispatch.Receiver()
+        received = []
+        def first(message, address):
+            received.append("first")
+            recv.removeCallback("/foo", second)
+            recv.addCallback("/foo", third)
+        def second(message, address):
+            received.append("second")
+        def third(message, address):
+            received.append("third")
+        recv.addCallback("/foo", first)
+        recv.addCallback("/foo", second)
+        recv.compile()
+        recv.dispatch(osc.Message("/foo"), None)
+        self.assertEquals(sorted(received), ["first", "second"])
+        del received[:]
+        recv.removeCallback("/foo", first)
+        recv.dispatch(osc.Message("/foo"), None)
+        self.assertEquals(received, ["third"])
+
+
+
     def testDispatching(self):
 
         hello = osc.Message("/hello")
@@ -336,6 +544,25 @@ class TestReceiver(unittest.TestCase):
         self.assertEquals(state, {'cb': True, 'cb2': True})
 
 
+    def testDispatchingInOrder(self):
+        addr = ("0.0.0.0", 17778)
+        received = []
+        def cb(message, a):
+            received.append(message.address)
+
+        recv = dispatch.Receiver()
+        recv.addCallback("/*", cb)
+        recv.setFallback(cb)
+        messages = [osc.Message("/%d" % (i)) for i in range(10)]
+        bundle = osc.Bundle(messages[:3] + [osc.Bundle(messages[3:8])] + messages[8:])
+        recv.dispatch(bundle, addr)
+        self.assertEquals(received, [m.address for m in messages])
+
+        received[:] = []
+        recv.dispatchBinary(bundle.toBinary(), addr)
+        self.assertEquals(received, [m.address for m in messages])
+
+
     def testFunctionFallback(self):
         hello = osc.Message("/hello")
         addr = ("0.0.0.0", 17778)
@@ -364,6 +591,81 @@ class TestReceiver(unittest.TestCase):
         recv.fallback = dummy.fb
         recv.dispatch(hello, addr)
 
+class TestBundleScheduler(unittest.TestCase):
+    """
+    Test the L{dispatch.BundleScheduler} class, through L{dispatch.Receiver}.
+    """
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000)
+        self.received = []
+        self.recv = dispatch.Receiver()
+        self.recv.addCallback("/*", lambda m, c: self.received.append(m.address))
+
+    def _bundle(self, when, *addresses):
+        return osc.Bundle([osc.Message(a) for a in addresses], osc.timeTagFromTime(when))
+
+    def testScheduling(self):
+        scheduler = self.recv.enableScheduling(self.clock)
+        self.recv.dispatch(self._bundle(1000.5, "/a", "/b"), None)
+        self.recv.dispatchBinary(self._bundle(1000.25, "/c").toBinary(), None)
+        self.recv.dispatch(osc.Bundle([self._bundle(1000.5, "/d"), osc.Message("/e")]), None)
+        self.recv.dispatch(osc.Message("/f"), None)
+        self.assertEquals(self.received, ["/e", "/f"])
+        self.assertEquals(len(scheduler), 4)
+        self.assertEquals(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(0.25)
+        self.assertEquals(self.received, ["/e", "/f", "/c"])
+        self.clock.advance(0.25)
+        self.assertEquals(self.received, ["/e", "/f", "/c", "/a", "/b", "/d"])
+        self.assertEquals(self.clock.getDelayedCalls(), [])
+
+    def testSingleTimer(self):
+        scheduler = self.recv.enableScheduling(self.clock)
+        for i in range(1000):
+            self.recv.dispatch(self._bundle(1001 + (i % 7) / 8.0, "/%d" % (i)), None)
+        self.assertEquals(len(self.clock.getDelayedCalls()), 1)
+        self.recv.dispatch(self._bundle(1000.5, "/first"), None)
+        self.assertEquals(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(0.5)
+        self.assertEquals(self.received, ["/first"])
+        self.clock.advance(1.5)
+        expected = sorted(range(1000), key=lambda i: (i % 7, i))
+        self.assertEquals(self.received[1:], ["/%d" % (i) for i in expected])
+        scheduler.clear()
+        self.assertEquals(self.clock.getDelayedCalls(), [])
+
+    def testEnableSchedulingAgain(self):
+        first = self.recv.enableScheduling(self.clock)
+        self.recv.dispatch(self._bundle(1000.5, "/a"), None)
+        self.recv.dispatch(self._bundle(1001, "/b"), None)
+        self.clock.advance(0.75)
+        second = self.recv.enableScheduling(self.clock, dispatch.LATE_DROP)
+        self.assertEquals((len(first), len(second)), (0, 1))
+        self.assertEquals(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(0.25)
+        self.assertEquals(self.received, ["/a", "/b"])
+        self.assertEquals(self.clock.getDelayedCalls(), [])
+
+    def testLatePolicies(self):
+        scheduler = self.recv.enableScheduling(self.clock, dispatch.LATE_DROP, tolerance=0.125)
+        self.recv.dispatch(self._bundle(999.5, "/late"), None)
+        self.recv.dispatch(self._bundle(999.875, "/tolerated"), None)
+        self.assertEquals(self.received, ["/tolerated"])
+        self.assertEquals((scheduler.late, scheduler.dropped), (1, 1))
+
+        scheduler = self.recv.enableScheduling(self.clock, dispatch.LATE_COUNT)
+        self.recv.dispatch(self._bundle(999.5, "/late"), None)
+        self.recv.dispatch(self._bundle(999.75, "/later"), None)
+        self.assertEquals(self.received, ["/tolerated", "/late", "/later"])
+        stats = scheduler.getStats()
+        self.assertEquals((stats["late"], stats["dropped"]), (2, 0))
+        self.assertEquals((stats["totalLateness"], stats["maxLateness"]), (0.75, 0.5))
+        self.assertRaises(ValueError, dispatch.BundleScheduler, None, self.clock, "never")
+
+
+
 class TestAddressNodeAndReceiver(unittest.TestCase):
     """
     Test both L{txosc.dispatch.Receiver} and L{txosc.dispatch.AddressNode}, 
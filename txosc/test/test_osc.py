@@ -7,12 +7,19 @@ Tests for txosc/osc.py
 Maintainer: Arjan Scherpenisse
 """
 
+import array
+import struct
 from twisted.trial import unittest
 from twisted.internet import reactor, defer, task
 from txosc import osc
 from txosc import async
 from txosc import dispatch
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class TestGetAddressParts(unittest.TestCase):
     """
     Test the getAddressParts function.
@@ -64,6 +71,23 @@ class TestArgument(unittest.TestCase):
         self.assertRaises(NotImplementedError, a.toBinary)
         self.assertRaises(NotImplementedError, a.fromBinary, "")
 
+    def testTrusted(self):
+        self.assertRaises(TypeError, osc.ColorArgument, (256, 0, 0, 0))
+        color = osc.ColorArgument.fromTrustedValue((255, 0, 0, 0))
+        self.assertEquals(color.value, (255, 0, 0, 0))
+        self.assertEquals(osc.BooleanArgument.fromTrustedValue(False).typeTag, "F")
+        self.assertEquals(osc.ColorArgument.fromTrustedValue((256, 0, 0, 0)).value, (256, 0, 0, 0))
+        decoded = osc.Message.fromBinary(osc.Message("/foo", 1).toBinary())[0]
+        self.assertTrue(decoded.arguments[0]._trusted)
+
+    def testTrustedMode(self):
+        osc.setTrustedMode(True)
+        try:
+            self.assertEquals(osc.ColorArgument((256, 0, 0, 0)).value, (256, 0, 0, 0))
+        finally:
+            osc.setTrustedMode(False)
+        self.assertRaises(TypeError, osc.ColorArgument, (256, 0, 0, 0))
+
 
 class TestBlobArgument(unittest.TestCase):
     """
@@ -179,6 +203,32 @@ class TestMidiArgument(unittest.TestCase):
         self.assertRaises(TypeError, osc.MidiArgument.toBinary, ()) # invalid value
 
 
+class TestOptionalArguments(unittest.TestCase):
+
+    def testToAndFromBinary(self):
+        def _test(cls, value, binary):
+            self.assertEquals(cls(value).toBinary(), binary)
+            arg, leftover = cls.fromBinary(binary + "egg")
+            self.assertEquals((type(arg), arg.value, leftover), (cls, value, "egg"))
+        _test(osc.Int64Argument, -1<<40, "\xff\xff\xff\0\0\0\0\0")
+        _test(osc.DoubleArgument, 1.5, "\x3f\xf8\0\0\0\0\0\0")
+        _test(osc.CharArgument, "a", "\0\0\0a")
+        _test(osc.SymbolArgument, "foo", "foo\0")
+        self.assertRaises(osc.OscError, osc.Int64Argument.fromBinary, "\0\0\0\0")
+        self.assertRaises(osc.OscError, osc.Int64Argument(1<<70).toBinary)
+        self.assertRaises(TypeError, osc.CharArgument, "ab")
+
+    def testInMessage(self):
+        message = osc.Message("/foo", osc.Int64Argument(1<<40), osc.DoubleArgument(0.25),
+            osc.CharArgument("x"), osc.SymbolArgument("bar"),
+            osc.ColorArgument((1, 2, 3, 4)), osc.MidiArgument((0, 144, 60, 127)))
+        self.assertEquals(message.getTypeTags(), "hdcSrm")
+        decoded = osc.Message.fromBinary(message.toBinary())[0]
+        self.assertEquals(decoded, message)
+        self.assertEquals([type(a) for a in decoded.arguments], [type(a) for a in message.arguments])
+
+
+
 class TestTimeTagArgument(unittest.TestCase):
     def testToBinary(self):
         # 1 second since Jan 1, 1900
@@ -204,6 +254,18 @@ class TestTimeTagArgument(unittest.TestCase):
 
         test(1.0)
         test(1.1331)
+        test(osc.timeTagFromTime(1287331200.25))
+        self.assertEquals(osc.TimeTagArgument(0.5).toBinary(), "\0\0\0\0\x80\0\0\0")
+        self.assertRaises(osc.OscError, osc.TimeTagArgument(-1.0).toBinary)
+
+    def testConversions(self):
+        now = 1287331200.75
+        self.assertEquals(osc.timeTagToTime(osc.timeTagFromTime(now)), now)
+        ntp = osc.ntpFromTime(now)
+        self.assertEquals(ntp, ((1287331200 + 2208988800) << 32) | 0xC0000000)
+        self.assertEquals(osc.timeFromNtp(ntp), now)
+        binary = osc.TimeTagArgument(osc.timeTagFromTime(now)).toBinary()
+        self.assertEquals(binary, struct.pack(">Q", ntp))
 
 
 
@@ -285,6 +347,31 @@ class TestMessage(unittest.TestCase):
         test(osc.Message("/example", osc.BooleanArgument(False), osc.NullArgument(), osc.StringArgument("hello")))
         test(osc.Message("/example", osc.ImpulseArgument()))
 
+    def testToBinary(self):
+        self.assertEquals(osc.Message("/foo", 1, "hi").toBinary(),
+                          "/foo\0\0\0\0,is\0\0\0\0\1hi\0\0")
+        self.assertEquals(osc.Message("/foo", True, 1.0).toBinary(),
+                          "/foo\0\0\0\0,Tf\0\x3f\x80\0\0")
+        self.assertRaises(OverflowError, osc.Message("/foo", 1<<31).toBinary)
+
+    def testGetBinarySize(self):
+        def test(m):
+            self.assertEquals(m.getBinarySize(), len(m.toBinary()))
+        test(osc.Message("/"))
+        test(osc.Message("/foo"))
+        test(osc.Message("/example", 1, 2.0, "three", True, None))
+        test(osc.Message("/example", osc.BlobArgument("blob"), osc.ColorArgument((1, 2, 3, 4))))
+
+    def testFromBinaryLeftover(self):
+        binary = osc.Message("/foo", 1, "bar", osc.BlobArgument("egg")).toBinary()
+        message, leftover = osc.Message.fromBinary(binary + "spam")
+        self.assertEquals(message, osc.Message("/foo", 1, "bar", osc.BlobArgument("egg")))
+        self.assertEquals(leftover, "spam")
+        # missing null terminator
+        self.assertRaises(osc.OscError, osc.Message.fromBinary, "/foo")
+        # truncated arguments
+        self.assertRaises(osc.OscError, osc.Message.fromBinary, binary[:-4])
+
     def testGetValues(self):
         # tests calling txosc.osc.Message.getValues()
         
@@ -296,6 +383,478 @@ class TestMessage(unittest.TestCase):
 
 
 
+class TestLazyMessage(unittest.TestCase):
+
+    def testFromBinary(self):
+        original = osc.Message("/foo", 1, 2.0, "bar", True, osc.BlobArgument("egg"))
+        message, leftover = osc.LazyMessage.fromBinary(original.toBinary())
+        self.assertEquals(leftover, "")
+        self.assertEquals(message.address, "/foo")
+        self.assertEquals(message.getTypeTags(), "ifsTb")
+        self.assertIdentical(message._arguments, None)
+        self.assertEquals(message.getValues(), [1, 2.0, "bar", True, "egg"])
+        self.assertEquals(message, original)
+        self.assertEquals(original, message)
+        self.assertEquals(message.toBinary(), original.toBinary())
+
+    def testInvalidData(self):
+        self.assertRaises(osc.OscError, osc.LazyMessage.fromBinary, "/foo\0\0\0\0,x\0\0")
+        # truncated arguments are only detected when they are decoded
+        message, leftover = osc.LazyMessage.fromBinary("/foo\0\0\0\0,i\0\0\0\0")
+        self.assertRaises(osc.OscError, message.getValues)
+
+    def testStr(self):
+        message = osc.LazyMessage.fromBinary(osc.Message("/foo", 1, "bar").toBinary())[0]
+        self.assertEquals(str(message), "/foo ,is")
+        self.assertIdentical(message._arguments, None)
+        message.getValues()
+        self.assertEquals(str(message), str(osc.Message("/foo", 1, "bar")))
+
+    def testLazyBundle(self):
+        bundle = osc.Bundle([osc.Message("/foo", 1), osc.Bundle([osc.Message("/bar", "baz")])])
+        element = osc._elementFromBinary(bundle.toBinary(), lazy=True)
+        self.assertIsInstance(element.elements[0], osc.LazyMessage)
+        self.assertIsInstance(element.elements[1].elements[0], osc.LazyMessage)
+        self.assertEquals(element, bundle)
+
+
+
+class TestTypeTagCodec(unittest.TestCase):
+
+    def testRuns(self):
+        codec = osc.TypeTagCodec("fffTisf")
+        # one struct for "fffTi", the string, and one struct for "f"
+        self.assertEquals(len(codec._steps), 3)
+        self.assertEquals(codec._steps[0][1].format, ">fffi")
+
+    def testToAndFromBinary(self):
+        values = [1.5, 2, "egg", True, None, "blob", -3]
+        codec = osc.TypeTagCodec("fisTNbi")
+        binary = codec.pack(values)
+        self.assertEquals(len(binary), codec.getBinarySize(values))
+        self.assertEquals(binary, osc.Message("/", 1.5, 2, "egg", True, None, osc.BlobArgument("blob"), -3).toBinary()[16:])
+        self.assertEquals(codec.decodeValues(binary, 0, len(binary)), (values, len(binary)))
+        arguments, offset = codec.decodeArguments(binary, 0, len(binary))
+        self.assertEquals([type(a) for a in arguments], [osc.FloatArgument, osc.IntArgument,
+            osc.StringArgument, osc.BooleanArgument, osc.NullArgument, osc.BlobArgument, osc.IntArgument])
+
+    def testErrors(self):
+        self.assertRaises(osc.OscError, osc.TypeTagCodec, "ix")
+        codec = osc.TypeTagCodec("ii")
+        self.assertRaises(osc.OscError, codec.decodeValues, "\0\0\0\1\0\0", 0, 6)
+        self.assertRaises(osc.OscError, codec.pack, [1])
+        self.assertRaises(osc.OscError, codec.pack, [1, 1<<40])
+
+    def _restoreTypeTags(self):
+        """
+        Restores the registered type tags when the test is done.
+        """
+        tables = [osc._tags, osc._fixedFormats, osc._variableHandlers]
+        saved = [dict(table) for table in tables]
+        def restore():
+            for table, copy in zip(tables, saved):
+                table.clear()
+                table.update(copy)
+            osc.codecCache.clear()
+        self.addCleanup(restore)
+
+    def testRegisterTypeTag(self):
+        self._restoreTypeTags()
+        class UInt32Argument(osc.Argument):
+            typeTag = "u"
+        osc.registerTypeTag("u", UInt32Argument, "I")
+        message = osc.Message("/foo", UInt32Argument(1<<31), osc.Int64Argument(2))
+        binary = message.toBinary()
+        self.assertEquals(binary[8:], ",uh\0\x80\0\0\0\0\0\0\0\0\0\0\2")
+        decoded = osc.Message.fromBinary(binary)[0]
+        self.assertEquals(decoded.getValues(), [1<<31, 2])
+        self.assertTrue(isinstance(decoded.arguments[0], UInt32Argument))
+        del osc._tags["u"]
+        del osc._fixedFormats["u"]
+        osc.codecCache.clear()
+        self.assertRaises(osc.OscError, osc.TypeTagCodec, "u")
+        self.assertRaises(ValueError, osc.registerTypeTag, "T", UInt32Argument, "I")
+        self.assertRaises(ValueError, osc.registerTypeTag, "u", UInt32Argument, "H")
+        self.assertRaises(ValueError, osc.registerTypeTag, "u", UInt32Argument)
+
+    def testCache(self):
+        osc.codecCache.clear()
+        hits, misses = osc.codecCache.hits, osc.codecCache.misses
+        binary = osc.Message("/foo", 1, 2.0).toBinary()
+        osc.Message.fromBinary(binary)
+        osc.Message.fromBinary(binary)
+        self.assertEquals(osc.codecCache.misses, misses + 1)
+        self.assertEquals(osc.codecCache.hits, hits + 1)
+        self.assertIdentical(osc.getTypeTagCodec("if"), osc.getTypeTagCodec("if"))
+
+
+
+class TestMessageTemplate(unittest.TestCase):
+
+    def testTrusted(self):
+        template = osc.MessageTemplate("/color", "r", trusted=True)
+        self.assertEquals(template.toMessage((1, 2, 3, 4)).getValues(), [(1, 2, 3, 4)])
+        self.assertEquals(template.toMessage("bad").getValues(), ["bad"])
+        self.assertRaises(TypeError, osc.MessageTemplate("/color", "r").toMessage, "bad")
+
+    def testEncode(self):
+        template = osc.MessageTemplate("/mixer/ch/3/gain", ",f")
+        self.assertNotIdentical(template._struct, None)
+        self.assertEquals(template.encode(0.5), osc.Message("/mixer/ch/3/gain", 0.5).toBinary())
+        self.assertRaises(osc.OscError, template.encode)
+        self.assertRaises(osc.OscError, template.encode, "foo")
+
+        template = osc.MessageTemplate("/foo", "isTb")
+        self.assertIdentical(template._struct, None)
+        self.assertEquals(template.encode(1, "bar", True, "egg"),
+            osc.Message("/foo", 1, "bar", True, osc.BlobArgument("egg")).toBinary())
+        self.assertEquals(template.toMessage(1, "bar", True, "egg"),
+            osc.Message("/foo", 1, "bar", True, osc.BlobArgument("egg")))
+
+        template = osc.MessageTemplate("/foo", "")
+        self.assertEquals(template.encode(), osc.Message("/foo").toBinary())
+
+    def testInvalidTypeTags(self):
+        self.assertRaises(osc.OscError, osc.MessageTemplate, "/foo", "ix")
+
+
+
+class TestArrayArgument(unittest.TestCase):
+
+    def testToAndFromBinary(self):
+        message = osc.Message("/foo", [1, [2.0, "bar"]], 3)
+        self.assertEquals(message.getTypeTags(), "[i[fs]]i")
+        self.assertEquals(message.toBinary(),
+            "/foo\0\0\0\0,[i[fs]]i\0\0\0\0\0\0\1\x40\0\0\0bar\0\0\0\0\3")
+        decoded = osc.Message.fromBinary(message.toBinary())[0]
+        self.assertEquals(decoded, message)
+        self.assertEquals(decoded.getValues(), [[1, [2.0, "bar"]], 3])
+        self.assertEquals(osc.Message.fromBinary("/foo\0\0\0\0,[]\0")[0].getValues(), [[]])
+
+    def testUnbalanced(self):
+        self.assertRaises(osc.OscError, osc.Message.fromBinary, "/foo\0\0\0\0,[i\0\0\0\0\0\1")
+        self.assertRaises(osc.OscError, osc.Message.fromBinary, "/foo\0\0\0\0,i]\0\0\0\0\1")
+
+    def testTypedArray(self):
+        values = array.array("f", [0.5, 1.5, -2.0])
+        message = osc.Message("/foo", osc.ArrayArgument(values), 1)
+        self.assertEquals(message.getTypeTags(), "[fff]i")
+        self.assertEquals(message.toBinary(), osc.Message("/foo", [0.5, 1.5, -2.0], 1).toBinary())
+        decoded = osc.Message.fromBinary(message.toBinary(), arrays=True)[0]
+        self.assertEquals(decoded.arguments[0].value, values)
+        self.assertIsInstance(decoded.arguments[0].value, array.array)
+
+
+
+class TestTypedArrayArgument(unittest.TestCase):
+
+    def testToAndFromBinary(self):
+        floats = array.array("f", [float(i) for i in range(512)])
+        ints = array.array("i", range(-3, 3))
+        message = osc.Message("/leds", floats, 7, ints, "end")
+        self.assertEquals(message.getTypeTags(), "f" * 512 + "i" * 7 + "s")
+        self.assertEquals(message.toBinary(),
+            osc.Message("/leds", *(list(floats) + [7] + list(ints) + ["end"])).toBinary())
+        self.assertEquals(message.getBinarySize(), len(message.toBinary()))
+
+        decoded = osc.Message.fromBinary(message.toBinary(), arrays=True)[0]
+        self.assertEquals(len(decoded.arguments), 3)
+        self.assertEquals(decoded.arguments[0].value, floats)
+        self.assertEquals(decoded.arguments[1].value, array.array("i", [7] + list(ints)))
+        self.assertEquals(decoded.toBinary(), message.toBinary())
+        self.assertEquals(len(osc.Message.fromBinary(message.toBinary())[0].arguments), 520)
+
+    def testDatalessAfterArrays(self):
+        messages = [
+            osc.Message("/foo", osc.ArrayArgument([True]), 7, True, 9),
+            osc.Message("/foo", [1], True, 2.5),
+            osc.Message("/foo", array.array("f", [1.0, 2.0, 3.0]), None, 4),
+            osc.Message("/foo", 1.0, 2.0, 3.0, True, 4),
+            ]
+        for message in messages:
+            binary = message.toBinary()
+            for arrays in False, True:
+                for cls in osc.Message, osc.LazyMessage:
+                    decoded = cls.fromBinary(binary, arrays=arrays)[0]
+                    self.assertEquals(decoded.getTypeTags(), message.getTypeTags())
+                    self.assertEquals(decoded.toBinary(), binary)
+        decoded = osc.Message.fromBinary(messages[0].toBinary())[0]
+        self.assertEquals(decoded.getValues(), [[True], 7, True, 9])
+        decoded = osc.Message.fromBinary(messages[3].toBinary(), arrays=True)[0]
+        self.assertEquals(decoded.getValues()[1:], [True, 4])
+
+    def testInvalid(self):
+        self.assertRaises(TypeError, osc.TypedArrayArgument, [1.0, 2.0])
+        self.assertRaises(TypeError, osc.TypedArrayArgument, array.array("c", "ab"))
+        self.assertRaises(osc.OscError, osc.Message("/foo", array.array("I", [1 << 31])).toBinary)
+        self.assertRaises(osc.OscError, osc.Message("/foo", array.array("L", [1 << 40])).toBinary)
+
+    def testNumpy(self):
+        values = numpy.arange(16, dtype=numpy.float32)
+        message = osc.Message("/foo", values)
+        self.assertEquals(message.toBinary(), osc.Message("/foo", *[float(v) for v in values]).toBinary())
+        decoded = osc.Message.fromBinary(message.toBinary(), arrays=True)[0]
+        self.assertEquals(list(decoded.arguments[0].value), list(values))
+
+    def testNumpyInvalid(self):
+        self.assertRaises(TypeError, osc.TypedArrayArgument, numpy.zeros((2, 2), "f4"))
+        template = osc.MessageTemplate("/foo", "ffff")
+        self.assertRaises(osc.OscError, template.encode, numpy.zeros((2, 2), "f4"))
+        self.assertRaises(osc.OscError, osc.Message("/foo", numpy.array([1 << 31], "u4")).toBinary)
+        self.assertEquals(osc.Message("/foo", numpy.array([7], "i8")).getValues()[0].tolist(), [7])
+        self.assertEquals(osc.Message("/foo", numpy.array([7], "i8")).toBinary(), osc.Message("/foo", 7).toBinary())
+
+    if numpy is None:
+        testNumpy.skip = "NumPy is not installed"
+        testNumpyInvalid.skip = "NumPy is not installed"
+
+
+
+class TestDecodeLimits(unittest.TestCase):
+
+    def testLimits(self):
+        limits = osc.DecodeLimits(maxPacketSize=256, maxDepth=2, maxArguments=4, maxBlobBytes=16)
+        def rejected(limit, element):
+            try:
+                osc._elementFromBinary(element.toBinary(), limits=limits)
+            except osc.DecodeLimitError, e:
+                self.assertEquals(e.limit, limit)
+            else:
+                self.fail("%s was not enforced" % (limit))
+        rejected("maxPacketSize", osc.Message("/foo", "x" * 256))
+        rejected("maxDepth", osc.Bundle([osc.Bundle([osc.Bundle()])]))
+        rejected("maxArguments", osc.Message("/foo", 1, 2, 3, 4, 5))
+        rejected("maxBlobBytes", osc.Message("/foo", osc.BlobArgument("x" * 10), osc.BlobArgument("x" * 10)))
+        self.assertEquals(limits.getStats(), {"maxPacketSize": 1, "maxDepth": 1, "maxArguments": 1, "maxBlobBytes": 1})
+        # the blob budget is per packet
+        blob = osc.Message("/foo", osc.BlobArgument("x" * 10)).toBinary()
+        self.assertEquals(len(osc.decodeMany([blob, blob], limits=limits)), 2)
+        self.assertRaises(osc.DecodeLimitError, list,
+            osc.iterMessagesFromBinary(osc.Bundle([osc.Bundle([osc.Bundle()])]).toBinary(), limits=limits))
+        self.assertRaises(osc.DecodeLimitError, osc.decodeMany,
+            [osc.Message("/foo", 1, 2, 3, 4, 5).toBinary()], columnar=True, limits=limits)
+
+    def testLazyBlobs(self):
+        # the blobs of lazy messages are counted without decoding the values
+        message = osc.Message("/foo", "abcd", [1, "x", osc.BlobArgument("y" * 5)], 1.5, 2.5,
+            osc.BlobArgument("x" * 10), osc.TimeTagArgument(3.0), osc.BlobArgument("z" * 7))
+        binary = osc.Bundle([message]).toBinary()
+        for arrays in (False, True):
+            limits = osc.DecodeLimits(maxBlobBytes=22)
+            lazy = list(osc.iterMessagesFromBinary(binary, True, arrays, limits))[0][1]
+            self.assertEquals(lazy.getValues(), osc.Message.fromBinary(message.toBinary(), arrays)[0].getValues())
+            limits.maxBlobBytes = 21
+            self.assertRaises(osc.DecodeLimitError, list, osc.iterMessagesFromBinary(binary, True, arrays, limits))
+            self.assertEquals(limits.getStats()["maxBlobBytes"], 1)
+
+
+
+class TestSlip(unittest.TestCase):
+
+    def testEncode(self):
+        self.assertEquals(osc.slipEncode("a\xc0b\xdbc"), "\xc0a\xdb\xdcb\xdb\xddc\xc0")
+
+    def testIncremental(self):
+        packets = ["\xdb\xdc\xc0", "\xdb\xdd", osc.Message("/foo", 1).toBinary()]
+        stream = "".join([osc.slipEncode(packet) for packet in packets])
+        decoder = osc.SlipDecoder()
+        received = []
+        for i in range(len(stream)):
+            received.extend(decoder.feed(stream[i]))
+        self.assertEquals(received, packets)
+        self.assertEquals(decoder.feed(stream), packets)
+
+    def testResynchronization(self):
+        decoder = osc.SlipDecoder(osc.DecodeLimits(maxPacketSize=8))
+        received = decoder.feed("ga\xdb!\xc0" + osc.slipEncode("x" * 9) + osc.slipEncode("ok"))
+        self.assertEquals(received, ["ok"])
+        self.assertEquals(decoder.errors, 1)
+        self.assertEquals(decoder.limits.getStats()["maxPacketSize"], 1)
+
+
+
+class TestBundlePacker(unittest.TestCase):
+
+    def testPacking(self):
+        packets = []
+        packer = osc.BundlePacker(packets.append, maxSize=200, timeTag=5.0)
+        messages = [osc.Message("/param/%d" % i, float(i)) for i in range(40)]
+        for message in messages[:-1]:
+            packer.add(message)
+        packer.add(osc.MessageTemplate("/param/39", "f").encode(39.0))
+        packer.flush()
+        packer.flush()
+        self.assertEquals(packer.packets, len(packets))
+        self.assertTrue(len(packets) > 1)
+        received = []
+        for packet in packets:
+            self.assertTrue(len(packet) <= 200)
+            for timeTag, message in osc.iterMessagesFromBinary(packet):
+                self.assertEquals(timeTag, 5.0)
+                received.append(message)
+        self.assertEquals(received, messages)
+
+    def testReusedBuffer(self):
+        packets = []
+        packer = osc.BundlePacker(packets.append)
+        long, short = osc.Message("/abcdefghijklmnop", 1), osc.Message("/a", 2)
+        packer.add(long)
+        packer.flush()
+        packer.add(short)
+        packer.flush()
+        self.assertEquals(packets[1], osc.Bundle([short]).toBinary())
+        self.assertEquals(osc.Bundle.fromBinary(packets[1])[0].elements, [short])
+
+    def testOversized(self):
+        packets = []
+        packer = osc.BundlePacker(packets.append, maxSize=64)
+        packer.add(osc.Message("/small"))
+        packer.add(osc.Message("/large", osc.BlobArgument("x" * 100)))
+        self.assertEquals(len(packets), 2)
+        self.assertEquals(osc.Bundle.fromBinary(packets[1])[0].elements[0].getValues(), ["x" * 100])
+        self.assertRaises(ValueError, osc.BundlePacker, packets.append, 16)
+
+
+
+class TestDecodeMany(unittest.TestCase):
+
+    def setUp(self):
+        self.elements = [
+            osc.Message("/a", 1.0, 2.0),
+            osc.Message("/b", 1, "foo"),
+            osc.Bundle([osc.Message("/c", 3.0, 4.0), osc.Message("/d", 2, "bar")], 5.0),
+            osc.Message("/e"),
+            ]
+        self.buffers = [e.toBinary() for e in self.elements]
+
+    def testElements(self):
+        self.assertEquals(osc.decodeMany(self.buffers), self.elements)
+        self.assertEquals(osc.decodeMany([]), [])
+        self.assertRaises(osc.OscError, osc.decodeMany, self.buffers + ["garbage"])
+
+    def testColumnar(self):
+        columns = osc.decodeMany(self.buffers, columnar=True)
+        self.assertEquals(sorted(columns.keys()), ["", "ff", "is"])
+
+        floats = columns["ff"]
+        self.assertEquals(len(floats), 2)
+        self.assertEquals(floats.addresses, ["/a", "/c"])
+        self.assertEquals(floats.values, array.array("f", [1.0, 2.0, 3.0, 4.0]))
+        self.assertEquals(floats.getColumn(1), array.array("f", [2.0, 4.0]))
+        self.assertEquals(floats.timeTags[0], True)
+        self.assertAlmostEqual(floats.timeTags[1], 5.0, 6)
+
+        mixed = columns["is"]
+        self.assertEquals(mixed.addresses, ["/b", "/d"])
+        self.assertEquals(mixed.values, [1, "foo", 2, "bar"])
+        self.assertEquals(mixed.getRow(1), [2, "bar"])
+        self.assertEquals(columns[""].addresses, ["/e"])
+
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def testEviction(self):
+        cache = osc.LRUCache(maxSize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEquals(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertFalse("b" in cache)
+        self.assertEquals(cache.get("b"), None)
+        self.assertEquals(cache.getStats(), {"size": 2, "maxSize": 2, "hits": 1, "misses": 1, "evictions": 1})
+        cache.setMaxSize(1)
+        self.assertEquals(len(cache), 1)
+        self.assertEquals(cache.get("c"), 3)
+
+    def testZeroSize(self):
+        cache = osc.LRUCache(maxSize=0)
+        cache.set("a", 1)
+        self.assertEquals(len(cache), 0)
+
+
+
+class TestAddressPath(unittest.TestCase):
+
+    def testGetAddressPath(self):
+        address, path = osc.getAddressPath("/foo/bar")
+        self.assertEquals(address, "/foo/bar")
+        self.assertEquals(path, ("foo", "bar"))
+        self.assertTrue(osc.getAddressPath("/foo/bar")[1] is path)
+
+    def testDecodedAddressesAreShared(self):
+        binary = osc.Message("/interned/address", 1).toBinary()
+        first = osc.Message.fromBinary(binary)[0]
+        second = osc.Message.fromBinary(binary)[0]
+        self.assertTrue(first.address is second.address)
+
+
+
+class TestFrozenMessage(unittest.TestCase):
+
+    def testFreeze(self):
+        message = osc.Message("/foo", 1, "bar")
+        frozen = message.freeze()
+        self.assertEquals(frozen, message)
+        self.assertEquals(message, frozen)
+        self.assertEquals(frozen.toBinary(), message.toBinary())
+        self.assertTrue(frozen.toBinary() is frozen.toBinary())
+        self.assertTrue(frozen.freeze() is frozen)
+        self.assertRaises(TypeError, frozen.add, 2)
+        self.assertRaises(AttributeError, setattr, frozen, "address", "/egg")
+
+    def testHash(self):
+        first = osc.FrozenMessage("/foo", 1, 2.5)
+        second = osc.Message("/foo", 1, 2.5).freeze()
+        self.assertEquals(hash(first), hash(second))
+        self.assertEquals(len(set([first, second])), 1)
+        self.assertNotEqual(first, osc.FrozenMessage("/foo", 1))
+
+    def testFrozenBundle(self):
+        bundle = osc.Bundle([osc.Message("/foo", 1), osc.Message("/foo", 1)], 1234)
+        frozen = bundle.freeze()
+        self.assertTrue(isinstance(frozen.elements[0], osc.FrozenMessage))
+        self.assertEquals(frozen.toBinary(), bundle.toBinary())
+        self.assertEquals(frozen.getBinarySize(), bundle.getBinarySize())
+        self.assertEquals(len(frozen.getMessages()), 1)
+        self.assertEquals(frozen, osc.Bundle.fromBinary(bundle.toBinary())[0].freeze())
+        self.assertNotEqual(frozen, osc.FrozenBundle(bundle.elements, 1235))
+        outer = osc.Bundle([frozen, osc.Message("/bar")])
+        self.assertEquals(osc.Bundle.fromBinary(outer.toBinary())[0], outer)
+
+
+
+class TestCompactMessage(unittest.TestCase):
+
+    def testConversions(self):
+        message = osc.Message("/foo", 1, 2.5, "bar", True, None)
+        compact = osc.CompactMessage.fromMessage(message)
+        self.assertEquals(compact.address, "/foo")
+        self.assertEquals(compact.typeTags, "ifsTN")
+        self.assertEquals(compact.values, (1, 2.5, "bar", True, None))
+        self.assertFalse(hasattr(compact, "__dict__"))
+        self.assertEquals(compact.toMessage(), message)
+        self.assertEquals(compact, message)
+        self.assertEquals(message, compact)
+        self.assertNotEqual(compact, osc.CompactMessage("/foo", "i", (1,)))
+
+    def testToAndFromBinary(self):
+        message = osc.Message("/foo", 1, 2.5, "bar", False, osc.BlobArgument("egg"))
+        compact = osc.CompactMessage.fromMessage(message)
+        self.assertEquals(compact.toBinary(), message.toBinary())
+        self.assertEquals(compact.getBinarySize(), message.getBinarySize())
+        decoded, leftover = osc.CompactMessage.fromBinary(message.toBinary())
+        self.assertEquals(leftover, "")
+        self.assertEquals(decoded.values, compact.values)
+        self.assertRaises(osc.OscError, osc.CompactMessage.fromBinary, "/foo\0\0\0\0bar\0")
+
+    def testInBundle(self):
+        compact = osc.CompactMessage("/foo", "i", (1,))
+        bundle = osc.Bundle([compact])
+        self.assertEquals(osc.Bundle.fromBinary(bundle.toBinary())[0].elements, [compact])
+
+
+
 class TestBundle(unittest.TestCase):
 
     def testEquality(self):
@@ -331,6 +890,37 @@ class TestBundle(unittest.TestCase):
         nested = osc.Bundle([osc.Message("/hello")])
         test(osc.Bundle([nested, osc.Message("/foo")]))
 
+    def testToBinary(self):
+        nested = osc.Bundle([osc.Message("/hello")])
+        bundle = osc.Bundle([nested, osc.Message("/foo", 1)])
+        binary = bundle.toBinary()
+        self.assertEquals(bundle.getBinarySize(), len(binary))
+        timeTag = osc.TimeTagArgument(True).toBinary()
+        nestedBinary = "#bundle\0" + timeTag + "\0\0\0\x0c/hello\0\0,\0\0\0"
+        self.assertEquals(binary,
+            "#bundle\0" + timeTag +
+            "\0\0\0" + chr(len(nestedBinary)) + nestedBinary +
+            "\0\0\0\x10/foo\0\0\0\0,i\0\0\0\0\0\1")
+
+    def testIterMessages(self):
+        m1 = osc.Message("/foo")
+        m2 = osc.Message("/bar")
+        m3 = osc.Message("/foo/baz")
+        m4 = osc.Message("/egg")
+        b = osc.Bundle([m1, osc.Bundle([m2, osc.Bundle([m3], 3.0)]), m4], 2.0)
+        expected = [(2.0, m1), (2.0, m2), (3.0, m3), (2.0, m4)]
+        self.assertEquals(list(b.iterMessages()), expected)
+        self.assertEquals(list(osc.iterMessagesFromBinary(b.toBinary())), expected)
+        self.assertEquals(list(osc.iterMessagesFromBinary(m1.toBinary())), [(True, m1)])
+
+    def testIterMessagesIncrementally(self):
+        binary = osc.Bundle([osc.Message("/foo"), osc.Message("/bar")]).toBinary()
+        # the second element is corrupted, but the first one is decoded
+        binary = binary[:-12] + "garbage\0\0\0\0\0"
+        iterator = osc.iterMessagesFromBinary(binary)
+        self.assertEquals(iterator.next()[1], osc.Message("/foo"))
+        self.assertRaises(osc.OscError, iterator.next)
+
     def testGetMessages(self):
 
         m1 = osc.Message("/foo")